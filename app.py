@@ -1,135 +1,117 @@
 import os
 import json
-from flask import Flask, request, jsonify, render_template
+import hashlib
+import logging
+from flask import Blueprint, Flask, request, jsonify, render_template
 from flask_cors import CORS
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-import google.generativeai as genai
 from dotenv import load_dotenv
-from typing import Dict, List, Any
-from dataclasses import dataclass
-from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
 import random
-import requests
+from overpass_client import OverpassClient
+from concurrency import DEFAULT_QUEUE_TIMEOUT, AdmissionLimiter, Overloaded, SingleFlight, thread_bound_limit
+from overpass_planner import build_union_query, plan_route_queries
+from tile_cache import TileCache, create_tile_cache, filters_namespace, scan_route_tiles
+from route_geometry import adaptive_sample
+from spatial_index import GridIndex
+from parking_store import ParkingTable, as_parking_table, serialize_parking
+from telemetry import REGISTRY, cache_collector, configure_logging, instrument_app, span
+
+# Route page and parking scan; served on their own by create_app below (python app.py)
+# or together with the chat API by wsgi.create_app
+parking_api = Blueprint("parking", __name__)
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Load environment variables from .env file (OVERPASS_URL and the other settings below)
+load_dotenv()
 
-os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+# Overpass tag filters of the two route scans below
+PARKING_FILTERS = ['["amenitys"="parkings"]', '["parkings"]', '["parkings:lanes"]']
+LEGACY_PARKING_FILTERS = ['["amenity"="parking"]', '["parking"]', '["parking:lane"]']
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# Shared, pooled Overpass client (OVERPASS_URL, OVERPASS_MAX_WORKERS, OVERPASS_REQUESTS_PER_SECOND)
+overpass_client = OverpassClient()
 
-# Load environment variables from .env file (for API_KEY and other sensitive details)
-load_dotenv()
+# Parking elements cached per map tile (PARKING_TILE_CACHE_PATH, PARKING_TILE_TTL, PARKING_TILE_ZOOM)
+parking_tile_cache = create_tile_cache()
+REGISTRY.register_collector(cache_collector({"parking_tiles": lambda: parking_tile_cache.stats()}))
+
+# /api/parking admission: route scans run at once per process (by default one less than the
+# request threads, see thread_bound_limit), and seconds the others queue before a 429
+PARKING_MAX_CONCURRENCY = int(os.getenv("PARKING_MAX_CONCURRENCY", thread_bound_limit()))
+PARKING_QUEUE_TIMEOUT = float(os.getenv("PARKING_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT))
 
-# Set the environment variable for Google Cloud authentication (use your Service Account JSON file path)
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "service-account-key.json"  # Update with your actual file path
-
-# Configuration for Google API Key (Gemini API Key)
-API_KEY = os.getenv("MY_API_KEY")  # Ensure your API key is saved in .env
-if not API_KEY:
-    raise ValueError("API Key is not set. Please add your API Key to the .env file.")
-genai.configure(api_key=API_KEY)
-
-# Initialize embedding model (Google Generative AI Embeddings)
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-
-# Path to PDFs
-RULES_PDF_PATH = "Structured-Rules-data.pdf"  # Update with the actual rules PDF path
-
-# Add new parking data processing functionality
-@dataclass
-class ParkingSpot:
-    id: str
-    location: List[float]
-    type: str
-    capacity: int = 0
-    fee: bool = False
-    maxstay: str = ""
-    disabled_spaces: int = 0
-    surface: str = ""
-    access: str = "public"
+# Largest `radius_m` accepted by /api/parking (metres around each route point)
+MAX_PARKING_RADIUS_M = 1000
+
+# Identical scans in flight (same route, format and radius) share one Overpass scan (PARKING_COALESCE=0 disables)
+PARKING_COALESCE = os.getenv("PARKING_COALESCE", "1") != "0"
+parking_limiter = AdmissionLimiter("parking", PARKING_MAX_CONCURRENCY, PARKING_QUEUE_TIMEOUT)
+parking_flights = SingleFlight("parking", enabled=PARKING_COALESCE)
 
 class ParkingDataProcessor:
-    def __init__(self):
-        self.base_url = 'https:/overpass-api.de/api/interpreter'
+    def __init__(self, client: OverpassClient = None, tile_cache: TileCache = None, merge_radius_m: float = 2.0):
+        self.client = client or overpass_client
+        self.tile_cache = tile_cache or parking_tile_cache
+        self.merge_radius_m = merge_radius_m  # Spots closer than this are treated as one
+        self.base_url = self.client.base_url
 
-    def get_parking_along_route(self, coordinates: List[List[float]], buffer_distance: float = 0.002) -> List[Dict[str, Any]]:
+    def get_parking_along_route(self, coordinates: List[List[float]], buffer_distance: float = 0.002) -> ParkingTable:
         """
         Fetch parking data along a route with intelligent sampling and filtering.
+        Spots are returned as a compact ParkingTable; serialize it with `serialize_parking`.
 
         Args:
             coordinates: List of [longitude, latitude] points along the route
             buffer_distance: Search radius around each point (in degrees, ~200m)
         """
-        parking_data = []
-        processed_ids = set()
-
         # Sample coordinates more densely in urban areas, sparsely in rural
-        sampled_coords = self._adaptive_coordinate_sampling(coordinates)
+        with span("route_sampling"):
+            sampled_coords = self._adaptive_coordinate_sampling(coordinates)
+            bboxes = [self._calculate_bbox(coord, buffer_distance) for coord in sampled_coords]
 
-        for coord in sampled_coords:
-            bbox = self._calculate_bbox(coord, buffer_distance)
-            query = self._build_overpass_query(bbox)
+        # Tiles scanned recently are served from the cache; only missing tiles hit Overpass
+        with span("tile_scan"):
+            parking_data = scan_route_tiles(self.tile_cache, filters_namespace(PARKING_FILTERS), bboxes, self._fetch_regions)
 
-            try:
-                response = requests.post(self.base_url, data=query, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-
-                for element in data.get('elements', []):
-                    if element['id'] not in processed_ids:
-                        parking_info = self._process_parking_element(element, coord)
-                        if parking_info:
-                            parking_data.append(parking_info)
-                            processed_ids.add(element['id'])
-
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching parking data: {str(e)}")
-                continue
+        with span("dedup_merge"):
+            return self._deduplicate_and_merge(parking_data)
 
-        return self._deduplicate_and_merge(parking_data)
+    def _fetch_regions(self, bboxes: List[List[float]]) -> List[Tuple[List[List[float]], Optional[List[Dict[str, Any]]]]]:
+        """
+        Fetch and process parking data for the given boxes.
+        Returns, per Overpass request, the boxes it covered and the processed spots (None if it failed).
+        """
+        # Coalesce the boxes into a few regions, one union query each
+        regions = plan_route_queries(bboxes)
+        queries = [self._build_overpass_query(region.bboxes) for region in regions]
 
-    def _adaptive_coordinate_sampling(self, coordinates: List[List[float]]) -> List[List[float]]:
-        """Sample coordinates based on route characteristics."""
-        sampled = []
-        min_distance = 0.002  # Minimum distance between samples (~200m)
+        # Fetch every region concurrently; results come back in route order
+        results = self.client.fetch_all(queries)
 
-        for i, coord in enumerate(coordinates):
-            if i == 0 or i == len(coordinates) - 1:
-                sampled.append(coord)
+        fetched = []
+        for region, data in zip(regions, results):
+            if data is None:
+                fetched.append((region.bboxes, None))
                 continue
 
-            # Check if we're in an urban area (more coordinates clustered together)
-            is_urban = self._is_urban_area(coordinates, i)
-            sample_distance = min_distance if is_urban else min_distance * 3
-
-            if not sampled or self._calculate_distance(sampled[-1], coord) >= sample_distance:
-                sampled.append(coord)
-
-        return sampled
-
-    def _is_urban_area(self, coordinates: List[List[float]], index: int, window: int = 5) -> bool:
-        """Determine if coordinate is in an urban area based on point density."""
-        start = max(0, index - window)
-        end = min(len(coordinates), index + window)
-        segment = coordinates[start:end]
-
-        if len(segment) < 3:
-            return False
-
-        # Calculate average distance between points
-        distances = []
-        for i in range(len(segment) - 1):
-            distances.append(self._calculate_distance(segment[i], segment[i + 1]))
+            parking_data = []
+            for element in data.get('elements', []):
+                parking_info = self._process_parking_element(element, region.center)
+                if parking_info:
+                    parking_data.append(parking_info)
+            fetched.append((region.bboxes, parking_data))
 
-        avg_distance = sum(distances) / len(distances)
-        return avg_distance < 0.001  # Threshold for urban area
+        return fetched
 
-    def _calculate_distance(self, coord1: List[float], coord2: List[float]) -> float:
-        """Calculate simple Euclidean distance between coordinates."""
-        return ((coord1[0] - coord2[0]) ** 2 + (coord1[1] - coord2[1]) ** 2) ** 0.5
+    def _adaptive_coordinate_sampling(self, coordinates: List[List[float]]) -> List[List[float]]:
+        """
+        Sample coordinates based on route characteristics: ~200 m apart in urban areas
+        (dense route points), ~600 m in rural ones. Distances are haversine metres,
+        computed for the whole route at once (see route_geometry).
+        """
+        return adaptive_sample(coordinates)
 
     def _calculate_bbox(self, coord: List[float], buffer: float) -> List[float]:
         """Calculate bounding box around coordinate."""
@@ -140,19 +122,9 @@ class ParkingDataProcessor:
             coord[1] + buffer   # max lat
         ]
 
-    def _build_overpass_query(self, bbox: List[float]) -> str:
-        """Build Overpass API query for parking data."""
-        return f"""
-        [out:json][timeout:25];
-        (
-            way({bbox[1]},{bbox[0]},{bbox[3]},{bbox[2]})["amenitys"="parkings"];
-            way({bbox[1]},{bbox[0]},{bbox[3]},{bbox[2]})["parkings"];
-            way({bbox[1]},{bbox[0]},{bbox[3]},{bbox[2]})["parkings:lanes"];
-        );
-        out body;
-        >;
-        out skel qt;
-        """
+    def _build_overpass_query(self, bboxes: List[List[float]]) -> str:
+        """Build one Overpass API union query for parking data in all the given boxes."""
+        return build_union_query(bboxes, PARKING_FILTERS)
 
     def _process_parking_element(self, element: Dict, coord: List[float]) -> Dict[str, Any]:
         """Process raw parking element into structured format."""
@@ -184,141 +156,105 @@ class ParkingDataProcessor:
             }
         }
 
-    def _deduplicate_and_merge(self, parking_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Deduplicate parking spots and merge nearby duplicates."""
-        merged = defaultdict(list)
-
-        # Group by location (rounded to 5 decimal places)
-        for spot in parking_data:
-            key = (
-                round(spot['location'][0], 5),
-                round(spot['location'][1], 5)
-            )
-            merged[key].append(spot)
-
-        # Merge spots at the same location
-        result = []
-        for spots in merged.values():
-            if len(spots) == 1:
-                result.append(spots[0])
-            else:
-                result.append(self._merge_parking_spots(spots))
+    def _deduplicate_and_merge(self, parking_data, merge_radius_m: float = None) -> ParkingTable:
+        """Deduplicate parking spots and merge spots within `merge_radius_m` of each other."""
+        table = as_parking_table(parking_data)
+        if not len(table):
+            return table
+        merge_radius_m = merge_radius_m or self.merge_radius_m
 
-        return result
+        # Group spots that lie within the merge radius (grid hash, near-linear in the number of spots);
+        # the first spot of each group is kept, with missing fields filled from the others
+        index = GridIndex(table.locations(), cell_m=merge_radius_m)
+        return table.merged(index.clusters(merge_radius_m))
 
-    def _merge_parking_spots(self, spots: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Merge multiple parking spots at the same location."""
-        base = spots[0].copy()
-
-        # Merge parking details
-        for spot in spots[1:]:
-            for key, value in spot['parking'].items():
-                if value and not base['parking'][key]:
-                    base['parking'][key] = value
-
-        return base
+    def spots_near_route(self, coordinates: List[List[float]], parking_data,
+                         radius_m: float = 100.0) -> List[List[int]]:
+        """
+        For every route point, the indices into `parking_data` of the spots within
+        `radius_m` metres, nearest first.
+        """
+        table = as_parking_table(parking_data)
+        if not len(table):
+            return [[] for _ in coordinates]
+        with span("near_route"):
+            index = GridIndex(table.locations(), cell_m=radius_m)
+            return [index.within(coord, radius_m) for coord in coordinates]
 
 # Add this function after the existing imports:
 def get_parking_data(coordinates: List[List[float]]) -> List[Dict]:
     """
     Fetch parking data along a route using Overpass API
     """
-    parking_data = []
     buffer = 0.002  # Roughly 200 meters buffer around the route
 
     # Sample coordinates to reduce API calls (take every 5th coordinate)
     sampled_coords = coordinates[::5]
 
-    for coord in sampled_coords:
-        bbox = [
+    bboxes = [
+        [
             coord[0] - buffer,  # min lon
             coord[1] - buffer,  # min lat
             coord[0] + buffer,  # max lon
             coord[1] + buffer   # max lat
         ]
+        for coord in sampled_coords
+    ]
+
+    def fetch(tile_bboxes):
+        # Coalesce the missing tiles into a few union queries for parking facilities
+        regions = plan_route_queries(tile_bboxes)
+        queries = [build_union_query(region.bboxes, LEGACY_PARKING_FILTERS) for region in regions]
+        fetched = []
+
+        for region, data in zip(regions, overpass_client.fetch_all(queries)):
+            if data is None:
+                fetched.append((region.bboxes, None))
+                continue
+            coord = region.center
+            parking_data = []
+            seen_ids = set()
 
-        # Overpass query for parking facilities
-        query = f"""
-        [out:json][timeout:25];
-        (
-            way({bbox[1]},{bbox[0]},{bbox[3]},{bbox[2]})["amenity"="parking"];
-            way({bbox[1]},{bbox[0]},{bbox[3]},{bbox[2]})["parking"];
-            way({bbox[1]},{bbox[0]},{bbox[3]},{bbox[2]})["parking:lane"];
-        );
-        out body;
-        >;
-        out skel qt;
-        """
-
-        try:
-            response = requests.post('https://overpass-api.de/api/interpreter', data=query)
-            data = response.json()
-
-            for element in data.get('elements', []):
-                if element.get('tags'):
-                    parking_info = {
-                        'id': element['id'],
-                        'location': [
-                            element.get('center', {}).get('lon', coord[0]),
-                            element.get('center', {}).get('lat', coord[1])
-                        ],
-                        'type': element['type'],
-                        'tags': element['tags'],
-                        'parking': {
-                            'type': element['tags'].get('parking'),
-                            'access': element['tags'].get('access'),
-                            'fee': element['tags'].get('parking:fee') or element['tags'].get('fee'),
-                            'maxstay': element['tags'].get('parking:maxstay'),
-                            'capacity': element['tags'].get('capacity'),
-                            'disabled': element['tags'].get('capacity:disabled'),
-                            'surface': element['tags'].get('surface'),
-                            'lanes': {
-                                'left': element['tags'].get('parking:lane:left'),
-                                'right': element['tags'].get('parking:lane:right'),
-                                'both': element['tags'].get('parking:lane:both')
+            try:
+                for element in data.get('elements', []):
+                    if element.get('tags'):
+                        parking_info = {
+                            'id': element['id'],
+                            'location': [
+                                element.get('center', {}).get('lon', coord[0]),
+                                element.get('center', {}).get('lat', coord[1])
+                            ],
+                            'type': element['type'],
+                            'tags': element['tags'],
+                            'parking': {
+                                'type': element['tags'].get('parking'),
+                                'access': element['tags'].get('access'),
+                                'fee': element['tags'].get('parking:fee') or element['tags'].get('fee'),
+                                'maxstay': element['tags'].get('parking:maxstay'),
+                                'capacity': element['tags'].get('capacity'),
+                                'disabled': element['tags'].get('capacity:disabled'),
+                                'surface': element['tags'].get('surface'),
+                                'lanes': {
+                                    'left': element['tags'].get('parking:lane:left'),
+                                    'right': element['tags'].get('parking:lane:right'),
+                                    'both': element['tags'].get('parking:lane:both')
+                                }
                             }
                         }
-                    }
-
-                    # Avoid duplicate entries
-                    if not any(p['id'] == parking_info['id'] for p in parking_data):
-                        parking_data.append(parking_info)
-        except Exception as e:
-            print(f"Error fetching parking data: {str(e)}")
-            continue
-
-    return parking_data
 
-# Utility Functions
-def load_pdf_text(pdf_path):
-    """
-    Extract text content from a PDF file.
-    """
-    pdf_reader = PdfReader(pdf_path)
-    return "".join([page.extract_text() for page in pdf_reader.pages])
-
-def create_chunks(text):
-    """
-    Split text into manageable chunks using a RecursiveCharacterTextSplitter.
-    """
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-    return [{"text": chunk} for chunk in text_splitter.split_text(text)]
+                        # Avoid duplicate entries
+                        if parking_info['id'] not in seen_ids:
+                            seen_ids.add(parking_info['id'])
+                            parking_data.append(parking_info)
+            except Exception as e:
+                logger.warning("Error fetching parking data: %s", e)
+                parking_data = None
 
-def create_vector_store(rules_text):
-    """
-    Create a FAISS vector store for the rules.
-    """
-    rules_chunks = create_chunks(rules_text)
-    texts = [chunk["text"] for chunk in rules_chunks]
-    return FAISS.from_texts(texts=texts, embedding=embedding_model)
+            fetched.append((region.bboxes, parking_data))
+        return fetched
 
-def generate_response(prompt):
-    """
-    Generate a response using the Gemini Pro model.
-    """
-    model = genai.GenerativeModel("gemini-1.5-pro-002")
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    # Tiles scanned recently are served from the cache; only missing tiles hit Overpass
+    return scan_route_tiles(parking_tile_cache, filters_namespace(LEGACY_PARKING_FILTERS), bboxes, fetch)
 
 def get_road_details(road_name: str, road_data: Dict) -> Dict:
     """Get detailed configuration for a road based on its type."""
@@ -374,21 +310,22 @@ def generate_report(road_data: dict) -> dict:
     }
 
 def generate_parking_prompt(parking_data):
-    """Generate a structured prompt from parking data"""
+    """Generate a structured prompt from parking data (a ParkingTable or a list of spot dicts)"""
+    table = as_parking_table(parking_data)
+    s = table.strings.values
     parking_summary = []
 
-    for i, spot in enumerate(parking_data, 1):
+    rows = zip(table.type, table.access, table.fee, table.maxstay)
+    for i, (type_, access, fee, maxstay) in enumerate(rows, 1):
         details = []
-        p = spot.get('parking', {})
-
-        if p.get('type'):
-            details.append(f"Type: {p['type']}")
-        if p.get('access'):
-            details.append(f"Access: {p['access']}")
-        if p.get('fee'):
-            details.append(f"Fee: {p['fee']}")
-        if p.get('maxstay'):
-            details.append(f"Maximum stay: {p['maxstay']}")
+        if type_:
+            details.append(f"Type: {s[type_]}")
+        if access:
+            details.append(f"Access: {s[access]}")
+        if fee:
+            details.append(f"Fee: {s[fee]}")
+        if maxstay:
+            details.append(f"Maximum stay: {s[maxstay]}")
 
         parking_summary.append(f"Parking Spot {i}: {', '.join(details)}")
 
@@ -409,22 +346,134 @@ def summarize_route(route_data):
 
 def summarize_parking(parking_data):
     """Generate a concise summary of parking data"""
+    table = as_parking_table(parking_data)
+    counts = table.type_counts()
+    parallel, surface = counts.get('parallel', 0), counts.get('surface', 0)
     return {
-        "total_spots": len(parking_data),
+        "total_spots": len(table),
         "types": {
-            "parallel": sum(1 for p in parking_data if p.get('parking', {}).get('type') == 'parallel'),
-            "surface": sum(1 for p in parking_data if p.get('parking', {}).get('type') == 'surface'),
-            "other": sum(1 for p in parking_data if p.get('parking', {}).get('type') not in ['parallel', 'surface'])
+            "parallel": parallel,
+            "surface": surface,
+            "other": len(table) - parallel - surface
         }
     }
 
-# Load rules PDF content and create the vector store
-rules_text = load_pdf_text(RULES_PDF_PATH)
-vectorstore = create_vector_store(rules_text)
-
-@app.route('/')
+@parking_api.route('/')
 def index():
     return render_template('index.html')
 
+@parking_api.errorhandler(Overloaded)
+def overloaded(error):
+    """
+    Backpressure: no admission slot freed up in time, ask the client to retry shortly.
+    """
+    response = jsonify({"error": str(error)})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 429
+
+def check_parking_request(data):
+    """
+    Validate an /api/parking request.
+
+    Returns:
+        ((coordinates, radius_m, format), None), or (None, (payload, status)) on failure
+    """
+    coordinates = data.get("coordinates", [])
+    radius_m = data.get("radius_m", 100)
+    fmt = data.get("format", "columns")
+
+    if not coordinates:
+        return None, ({"error": "Route coordinates are required."}, 400)
+    if not isinstance(coordinates, list) or not all(valid_coordinate(coord) for coord in coordinates):
+        return None, ({"error": "coordinates must be a list of [longitude, latitude] pairs within range."}, 400)
+    if isinstance(radius_m, bool) or not isinstance(radius_m, (int, float)) or not 0 < radius_m <= MAX_PARKING_RADIUS_M:
+        return None, ({"error": f"radius_m must be a number of metres between 0 and {MAX_PARKING_RADIUS_M}."}, 400)
+    if fmt not in ("columns", "records", "geojson"):
+        return None, ({"error": "format must be one of columns, records or geojson."}, 400)
+    return (coordinates, float(radius_m), fmt), None
+
+def valid_coordinate(coord) -> bool:
+    """A [longitude, latitude] pair of finite numbers within the WGS84 range."""
+    if not isinstance(coord, (list, tuple)) or len(coord) != 2:
+        return False
+    if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in coord):
+        return False
+    lon, lat = coord
+    return -180 <= lon <= 180 and -90 <= lat <= 90
+
+def parking_flight_key(coordinates, radius_m, fmt):
+    """Scans with equal keys return the same spots, so one in flight can answer them all."""
+    digest = hashlib.sha256(json.dumps(coordinates, separators=(",", ":")).encode()).hexdigest()
+    return digest, radius_m, fmt
+
+def scan_parking(coordinates, radius_m, fmt, client: OverpassClient = None) -> Dict[str, Any]:
+    """
+    Scan parking along a route and return the /api/parking payload.
+    """
+    processor = ParkingDataProcessor(client)
+    parking_data = processor.get_parking_along_route(coordinates)
+    return {
+        "format": fmt,
+        "parking": serialize_parking(parking_data, fmt),
+        "near_route": processor.spots_near_route(coordinates, parking_data, radius_m),
+    }
+
+@parking_api.route("/api/parking", methods=["POST"])
+def parking_along_route():
+    """
+    Scan parking along a route.
+    Returns the merged parking spots in the requested `format` ("columns" by default,
+    "records" or "geojson") and, for each route point, the indices of the spots within
+    `radius_m` metres of it (nearest first).
+
+    At most PARKING_MAX_CONCURRENCY scans run at once (429 once the queue wait runs out),
+    and a scan of the same route already in flight is shared rather than repeated.
+    """
+    params, invalid = check_parking_request(request.get_json())
+    if invalid:
+        payload, status = invalid
+        return jsonify(payload), status
+
+    def scan():
+        with parking_limiter.admit():
+            return scan_parking(*params)
+
+    payload, _ = parking_flights.do(parking_flight_key(*params), scan)
+    return jsonify(payload)
+
+def create_app():
+    """
+    Standalone parking app: the route page and /api/parking. It needs no rules index, so
+    /healthz and /readyz report the parking scan itself; wsgi.create_app serves the same
+    routes next to the chat API, whose probes cover the index.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for all routes
+    instrument_app(app)  # Request and per-stage latency histograms (each Overpass request, dedup/merge) on /metrics
+    app.register_blueprint(parking_api)
+
+    @app.route("/healthz")
+    def healthz():
+        """
+        Liveness probe: the process is up.
+        """
+        return jsonify({"status": "ok"})
+
+    @app.route("/readyz")
+    def readyz():
+        """
+        Readiness probe: the parking scan needs nothing prepared, so it is ready once serving.
+        """
+        return jsonify({"status": "ready", "overpass_url": overpass_client.base_url})
+
+    @app.route("/cache/stats")
+    def cache_stats():
+        """
+        Hit ratio and staleness of the parking tile cache.
+        """
+        return jsonify({"parking_tiles": parking_tile_cache.stats()})
+
+    return app
+
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    create_app().run(debug=True, port=5000)
@@ -0,0 +1,203 @@
+"""
+Async serving path for the two upstream-bound endpoints, /query and /api/parking, on an
+aiohttp event loop:
+
+    python async_server.py                                   # port 8001
+    gunicorn "async_server:create_app()" -k aiohttp.GunicornWebWorker -b 0.0.0.0:8001
+
+Waiting on an upstream does not hold a thread: Gemini is awaited through its async client
+(generate_content_async) and Overpass through AsyncOverpassClient. The blocking steps that
+remain (retrieval, the SQLite caches, merging parking spots) run on a small executor
+(ASYNC_EXECUTOR_THREADS). Requests beyond QUERY_MAX_CONCURRENCY / PARKING_MAX_CONCURRENCY
+queue briefly and are then answered with 429, and identical requests in flight share one
+answer, as on the Flask endpoints. Routes, caches and the rules index are model.py's and
+app.py's; everything else stays on wsgi.py.
+"""
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from concurrency import AsyncAdmissionLimiter, AsyncSingleFlight, Overloaded
+from overpass_client import AsyncOverpassClient
+from telemetry import (PROMETHEUS_CONTENT_TYPE, REGISTRY, REQUEST_SECONDS, REQUESTS_IN_FLIGHT,
+                       UPSTREAM_IN_FLIGHT, in_request_context, span)
+
+# Threads for the blocking steps of a request (retrieval, cache lookups, parking merge)
+DEFAULT_EXECUTOR_THREADS = 8
+
+# Admission limits when QUERY_MAX_CONCURRENCY / PARKING_MAX_CONCURRENCY are not set. Waiting
+# requests hold no thread here, so they are not bound to WORKER_THREADS as on the Flask servers.
+DEFAULT_QUERY_MAX_CONCURRENCY = 16
+DEFAULT_PARKING_MAX_CONCURRENCY = 4
+
+EXECUTOR = web.AppKey("executor", ThreadPoolExecutor)
+OVERPASS = web.AppKey("overpass", AsyncOverpassClient)
+QUERY_LIMITER = web.AppKey("query_limiter", AsyncAdmissionLimiter)
+QUERY_FLIGHTS = web.AppKey("query_flights", AsyncSingleFlight)
+PARKING_LIMITER = web.AppKey("parking_limiter", AsyncAdmissionLimiter)
+PARKING_FLIGHTS = web.AppKey("parking_flights", AsyncSingleFlight)
+
+
+def run_blocking(request, fn, *args):
+    """Run `fn(*args)` on the app's executor, with spans landing in this request's context."""
+    return asyncio.get_running_loop().run_in_executor(request.app[EXECUTOR], in_request_context(fn), *args)
+
+
+async def generate_response(prompt):
+    """
+    Generate a response using the Gemini Pro model without blocking the event loop.
+    """
+    import model
+
+    with span("llm"), UPSTREAM_IN_FLIGHT.track(upstream="gemini"):
+        response = await model.llm.generate_content_async(prompt)
+    return response.text.strip()
+
+
+async def answer_query(request, index, prompt, sources, query, bypass_cache, started):
+    """
+    model.answer_query on the event loop: holds a query admission slot throughout and
+    raises Overloaded when none frees up in time. Returns the response payload.
+    """
+    import model
+
+    async with request.app[QUERY_LIMITER].admit():
+        context = await run_blocking(request, model.retrieve_context, index, prompt, sources, query, bypass_cache, started)
+        if context is None:
+            return {"response": "No relevant information found."}
+
+        response_text, cache_tier = await run_blocking(request, model.cached_response, context)
+        if response_text is not None:
+            return {"response": response_text, "cached": cache_tier, "sources": context["citations"], "context": context["context"]}
+
+        response_text = await generate_response(context["final_prompt"])
+        await run_blocking(request, model.response_cache.put, context["final_prompt"], context["scope"],
+                           context["query_embedding"], response_text)
+
+    return {"response": response_text, "sources": context["citations"], "context": context["context"]}
+
+
+async def query_documents(request):
+    """
+    /query, as in model.py: identical questions in flight are answered once (marked "coalesced").
+    """
+    import model
+
+    parsed, failure = await run_blocking(request, model.check_query, await request.json())
+    if failure:
+        payload, status, headers = failure
+        return web.json_response(payload, status=status, headers=headers)
+    index, prompt, sources, query, bypass_cache, started = parsed
+
+    payload, coalesced = await request.app[QUERY_FLIGHTS].do(
+        model.query_flight_key(index, prompt, sources, query, bypass_cache),
+        lambda: answer_query(request, *parsed),
+    )
+    if coalesced:
+        payload = dict(payload, coalesced=True)
+    return web.json_response(payload)
+
+
+async def parking_along_route(request):
+    """
+    /api/parking, as in app.py. The scan runs on the executor, its Overpass requests on the loop.
+    """
+    import app as parking
+
+    params, invalid = parking.check_parking_request(await request.json())
+    if invalid:
+        payload, status = invalid
+        return web.json_response(payload, status=status)
+
+    client = request.app[OVERPASS].threadsafe(asyncio.get_running_loop())
+
+    async def scan():
+        async with request.app[PARKING_LIMITER].admit():
+            return await run_blocking(request, parking.scan_parking, *params, client)
+
+    payload, _ = await request.app[PARKING_FLIGHTS].do(parking.parking_flight_key(*params), scan)
+    return web.json_response(payload)
+
+
+async def healthz(request):
+    import model
+
+    builder = model.rules_index_builder
+    return web.json_response(builder.status(), status=503 if builder.failed else 200)
+
+
+async def readyz(request):
+    import model
+
+    builder = model.rules_index_builder
+    return web.json_response(builder.status(), status=200 if builder.ready else 503)
+
+
+async def metrics(request):
+    """Prometheus scrape endpoint."""
+    return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+
+@web.middleware
+async def telemetry_middleware(request, handler):
+    """
+    Request histogram and in-flight counts, labelled like the Flask endpoints so both
+    servers feed the same dashboards; Overloaded becomes 429 with Retry-After.
+    """
+    endpoint = request.match_info.route.name or "unmatched"
+    started = time.perf_counter()
+    status = 500
+    try:
+        with REQUESTS_IN_FLIGHT.track(endpoint=endpoint):
+            try:
+                response = await handler(request)
+            except Overloaded as error:
+                response = web.json_response({"error": str(error)}, status=429,
+                                             headers={"Retry-After": str(error.retry_after)})
+            except web.HTTPException as error:
+                status = error.status
+                raise
+        status = response.status
+        return response
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method, status=status)
+
+
+def create_app():
+    """
+    The aiohttp app serving /query and /api/parking (plus /healthz, /readyz and /metrics).
+    """
+    import model
+    import app as parking
+
+    server = web.Application(middlewares=[telemetry_middleware])
+    server[QUERY_LIMITER] = AsyncAdmissionLimiter(
+        "query", int(os.getenv("QUERY_MAX_CONCURRENCY", DEFAULT_QUERY_MAX_CONCURRENCY)), model.QUERY_QUEUE_TIMEOUT)
+    server[QUERY_FLIGHTS] = AsyncSingleFlight("query", enabled=model.QUERY_COALESCE)
+    server[PARKING_LIMITER] = AsyncAdmissionLimiter(
+        "parking", int(os.getenv("PARKING_MAX_CONCURRENCY", DEFAULT_PARKING_MAX_CONCURRENCY)), parking.PARKING_QUEUE_TIMEOUT)
+    server[PARKING_FLIGHTS] = AsyncSingleFlight("parking", enabled=parking.PARKING_COALESCE)
+
+    async def start_clients(server):
+        server[EXECUTOR] = ThreadPoolExecutor(int(os.getenv("ASYNC_EXECUTOR_THREADS", DEFAULT_EXECUTOR_THREADS)),
+                                              thread_name_prefix="async-blocking")
+        server[OVERPASS] = AsyncOverpassClient()
+
+    async def close_clients(server):
+        await server[OVERPASS].close()
+        server[EXECUTOR].shutdown(wait=False)
+
+    server.on_startup.append(start_clients)
+    server.on_cleanup.append(close_clients)
+
+    server.router.add_post("/query", query_documents, name="chat.query_documents")
+    server.router.add_post("/api/parking", parking_along_route, name="parking.parking_along_route")
+    server.router.add_get("/healthz", healthz, name="chat.healthz")
+    server.router.add_get("/readyz", readyz, name="chat.readyz")
+    server.router.add_get("/metrics", metrics, name="metrics")
+    return server
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), port=8001)
@@ -0,0 +1,180 @@
+"""
+Bursty-load benchmark of /query: many users asking the same few questions at once, as when
+a popular route is shared. Compares three ways of serving it:
+
+- baseline: the Flask app with coalescing and the admission limit turned off (every request
+  does its own retrieval and Gemini call, as before)
+- sync: the Flask app as configured (QUERY_COALESCE, QUERY_MAX_CONCURRENCY)
+- async: async_server.py on aiohttp, with the same limits
+
+Each burst fires --burst requests at once, spread over --distinct new questions, against the
+fake Gemini of fakes.py limited to --llm-capacity calls at a time (an API quota). Reports
+latency percentiles of the answered requests, 429s, and the Gemini and embedding calls made.
+
+    python benchmarks/bench_burst.py --bursts 10 --burst 64 --distinct 4 --output burst.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import requests
+
+from fakes import FakeGenerativeModel, LatencyEmbeddings
+from bench_service import QUESTIONS, ROAD_DATA, git_revision, memory_mb, serve, setup_environment
+
+SETUPS = ["baseline", "sync", "async"]
+
+
+def serve_async(port):
+    """Run async_server's app on its own event loop thread; returns (stop, base_url)."""
+    from aiohttp import web
+    import async_server
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    runner = web.AppRunner(async_server.create_app())
+
+    async def start():
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    asyncio.run_coroutine_threadsafe(start(), loop).result()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return stop, f"http://127.0.0.1:{port}"
+
+
+def run_bursts(base_url, route_id, setup, args):
+    """Fire the bursts one after another; returns per-request (seconds, status, coalesced) tuples."""
+    local = threading.local()
+
+    def ask(payload):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{base_url}/query", json=payload, timeout=120)
+            status, coalesced = response.status_code, bool(response.ok and response.json().get("coalesced"))
+        except requests.exceptions.RequestException:
+            status, coalesced = None, False
+        return time.perf_counter() - started, status, coalesced
+
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=args.burst) as pool:
+        for burst in range(args.bursts):
+            payloads = [
+                {"query": f"{QUESTIONS[i % args.distinct % len(QUESTIONS)]} ({setup} burst {burst} question {i % args.distinct})",
+                 "route_id": route_id}
+                for i in range(args.burst)
+            ]
+            outcomes.extend(pool.map(ask, payloads))
+            time.sleep(args.pause)
+    return outcomes
+
+
+def summarize_bursts(outcomes, wall_seconds):
+    answered = [seconds for seconds, status, _ in outcomes if status == 200]
+    ms = np.asarray(answered or [0.0]) * 1000
+    return {
+        "requests": len(outcomes),
+        "answered": len(answered),
+        "rejected_429": sum(status == 429 for _, status, _ in outcomes),
+        "errors": sum(status not in (200, 429) for _, status, _ in outcomes),
+        "coalesced": sum(coalesced for _, _, coalesced in outcomes),
+        "throughput_rps": round(len(answered) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": {
+            "p50": round(float(np.percentile(ms, 50)), 2),
+            "p95": round(float(np.percentile(ms, 95)), 2),
+            "p99": round(float(np.percentile(ms, 99)), 2),
+            "max": round(float(ms.max()), 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--setups", nargs="+", default=SETUPS, choices=SETUPS)
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=64, help="requests fired at once per burst")
+    parser.add_argument("--distinct", type=int, default=4, help="different questions per burst")
+    parser.add_argument("--pause", type=float, default=0.2, help="seconds between bursts")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake Gemini call")
+    parser.add_argument("--llm-capacity", type=int, default=8, help="fake Gemini calls answered at once")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="seconds per fake embedding call")
+    parser.add_argument("--port", type=int, default=8766, help="port of the async server")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the rules PDF path is relative
+
+    with tempfile.TemporaryDirectory(prefix="bench-burst-") as workdir:
+        setup_environment(workdir, "http://127.0.0.1:9", 2.0)  # Overpass is not used
+        import model
+        from concurrency import AdmissionLimiter
+
+        model.llm = FakeGenerativeModel(args.llm_latency, capacity=args.llm_capacity)
+        model.embedding_model.inner = embedder = LatencyEmbeddings(args.embed_latency, model.embedding_model.inner)
+        while not (model.rules_index_builder.ready or model.rules_index_builder.failed):
+            time.sleep(0.05)
+
+        server, flask_url = serve(model.app)
+        stop_async, async_url = serve_async(args.port)
+        route_id = requests.post(f"{flask_url}/api/create-prompt", json={"roadData": ROAD_DATA}).json()["route_id"]
+        configured = (model.query_limiter, model.query_flights.enabled)
+
+        results = []
+        try:
+            for setup in args.setups:
+                if setup == "baseline":
+                    model.query_limiter = AdmissionLimiter("query", 2 ** 20)
+                    model.query_flights.enabled = False
+                else:
+                    model.query_limiter, model.query_flights.enabled = configured
+
+                llm_calls, embed_calls = model.llm.calls, embedder.calls
+                started = time.perf_counter()
+                outcomes = run_bursts(async_url if setup == "async" else flask_url, route_id, setup, args)
+                wall_seconds = time.perf_counter() - started
+                results.append(dict(
+                    setup=setup, **summarize_bursts(outcomes, wall_seconds),
+                    llm_calls=model.llm.calls - llm_calls,
+                    embedding_calls=embedder.calls - embed_calls,
+                    memory=memory_mb(),
+                ))
+                print(f"{setup}: {json.dumps(results[-1])}", file=sys.stderr)
+        finally:
+            server.shutdown()
+            stop_async()
+
+    report = {
+        "benchmark": "burst",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "limits": {"query_max_concurrency": model.QUERY_MAX_CONCURRENCY, "query_queue_timeout": model.QUERY_QUEUE_TIMEOUT},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
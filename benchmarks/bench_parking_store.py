@@ -0,0 +1,87 @@
+"""
+Benchmark parking result storage: the nested per-spot dicts ParkingDataProcessor used to
+return against the column store in parking_store, for memory and JSON serialization.
+
+    python benchmarks/bench_parking_store.py --spots 10000 100000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from overpass_stub import synthetic_way
+from parking_store import ParkingTable, serialize_parking
+
+
+def processed_spots(n_spots):
+    """Spots in the processed layout, from the stub's synthetic ways along a long corridor."""
+    spots = []
+    for i in range(n_spots):
+        element = synthetic_way(52000 + i // 20, -1900 + i % 20)
+        tags = element["tags"]
+        spots.append({
+            'id': str(element['id']),
+            'location': [element['center']['lon'], element['center']['lat']],
+            'type': element['type'],
+            'parking': {
+                'type': tags.get('parking'),
+                'access': tags.get('access', 'public'),
+                'fee': tags.get('fee', 'no'),
+                'maxstay': tags.get('maxstay', ''),
+                'capacity': tags.get('capacity', ''),
+                'disabled': tags.get('capacity:disabled', ''),
+                'surface': tags.get('surface', ''),
+                'lanes': {'left': '', 'right': '', 'both': ''},
+            },
+        })
+    return spots
+
+
+def measure(build):
+    tracemalloc.start()
+    value = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run(n_spots):
+    # Round-trip through JSON so the dicts hold fresh, unshared strings as after a tile-cache load
+    source = json.dumps(processed_spots(n_spots))
+    dicts, dict_bytes = measure(lambda: json.loads(source))
+    table, table_bytes = measure(lambda: ParkingTable.from_dicts(json.loads(source)))
+
+    dict_json, dict_seconds = timed(lambda: json.dumps(dicts))
+    columns_json, columns_seconds = timed(lambda: json.dumps(serialize_parking(table, "columns")))
+    _, records_seconds = timed(lambda: json.dumps(serialize_parking(table, "records")))
+
+    return {
+        "spots": n_spots,
+        "memory_bytes_per_spot": {"dicts": round(dict_bytes / n_spots, 1), "table": round(table_bytes / n_spots, 1)},
+        "serialize_ms": {
+            "dicts": round(dict_seconds * 1000, 2),
+            "table_columns": round(columns_seconds * 1000, 2),
+            "table_records": round(records_seconds * 1000, 2),
+        },
+        "payload_bytes": {"dicts": len(dict_json), "table_columns": len(columns_json)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spots", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+    print(json.dumps([run(n) for n in args.spots], indent=2))
@@ -0,0 +1,89 @@
+"""
+Benchmark route sampling: the per-point Python loop ParkingDataProcessor used to run
+against the vectorized NumPy version in route_geometry.
+
+    python benchmarks/bench_route_sampling.py --points 10000 100000
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route_geometry import adaptive_sample_indices, as_lonlat_array, urban_mask, segment_lengths
+
+
+def synthetic_route(n_points, seed=0):
+    """Mapbox-like geometry: dense urban stretches at both ends, sparse rural middle."""
+    rng = np.random.default_rng(seed)
+    urban = np.abs(np.linspace(-1, 1, n_points)) > 0.6
+    step = np.where(urban, 0.0004, 0.003) * rng.uniform(0.5, 1.5, n_points)
+    heading = np.cumsum(rng.normal(0, 0.05, n_points))
+    lon = -1.9 + np.cumsum(step * np.cos(heading))
+    lat = 52.48 + np.cumsum(step * np.sin(heading) * 0.6)
+    return np.column_stack([lon, lat]).tolist()
+
+
+def legacy_sampling(coordinates):
+    """The previous ParkingDataProcessor algorithm: Euclidean degrees, per-point window loop."""
+    def distance(a, b):
+        return ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
+
+    def is_urban(index, window=5):
+        segment = coordinates[max(0, index - window):min(len(coordinates), index + window)]
+        if len(segment) < 3:
+            return False
+        distances = [distance(segment[i], segment[i + 1]) for i in range(len(segment) - 1)]
+        return sum(distances) / len(distances) < 0.001
+
+    sampled = []
+    for i, coord in enumerate(coordinates):
+        if i == 0 or i == len(coordinates) - 1:
+            sampled.append(coord)
+            continue
+        sample_distance = 0.002 if is_urban(i) else 0.006
+        if distance(sampled[-1], coord) >= sample_distance:
+            sampled.append(coord)
+    return sampled
+
+
+def timed(fn, *args, repeat=3):
+    best = math.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    results = []
+    for n_points in args.points:
+        coordinates = synthetic_route(n_points)
+        legacy_s, legacy = timed(legacy_sampling, coordinates, repeat=1)
+        vector_s, indices = timed(lambda c: adaptive_sample_indices(as_lonlat_array(c)), coordinates)
+        points = as_lonlat_array(coordinates)
+        urban_share = float(urban_mask(segment_lengths(points), len(points)).mean())
+        results.append({
+            "points": n_points,
+            "legacy_seconds": round(legacy_s, 4),
+            "vectorized_seconds": round(vector_s, 4),
+            "speedup": round(legacy_s / vector_s, 1),
+            "legacy_samples": len(legacy),
+            "vectorized_samples": len(indices),
+            "urban_share": round(urban_share, 3),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Offline load benchmark of the chat API (model.py) and the parking scan (app.py).
+
+Google services are replaced by the fakes in benchmarks/fakes.py and Overpass by the
+local stub server, so no network access or API keys are needed. Scenarios:
+
+- create_prompt: POST /api/create-prompt at each concurrency level
+- query_repeated / query_unique: POST /query with one repeated question (served from the
+  caches) or unique questions with the caches bypassed (full retrieval + LLM path)
+- query_batch: POST /query/batch with --batch-size questions per request
+- parking: ParkingDataProcessor.get_parking_along_route on synthetic routes of each
+  length, with a cold and then a warm tile cache
+
+Every scenario reports latency percentiles (ms), throughput and process memory as JSON.
+
+    python benchmarks/bench_service.py --concurrency 1 4 16 --requests 100 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+from fakes import FakeGenerativeModel, LatencyEmbeddings
+from bench_route_sampling import synthetic_route
+from overpass_stub import start_stub_server
+
+ROAD_DATA = {"parking": "allowed", "motorways": ["M5"], "aRoads": ["A40", "A38"], "bRoads": ["B4009"]}
+QUESTIONS = [
+    "What lane width is needed next to a cycle lane?",
+    "How wide should a car parking bay be?",
+    "Can buses share a lane with cyclists?",
+    "What buffer is needed between parking and a cycle track?",
+]
+
+
+def memory_mb():
+    """Current and peak resident set size of this process in MB (Linux), else the peak only."""
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {
+            "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+            "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+        }
+    except (OSError, KeyError, ValueError):
+        import resource
+        return {"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def summarize(latencies, wall_seconds, errors=0):
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": {
+            "mean": round(float(ms.mean()), 2),
+            "p50": round(float(np.percentile(ms, 50)), 2),
+            "p95": round(float(np.percentile(ms, 95)), 2),
+            "p99": round(float(np.percentile(ms, 99)), 2),
+            "max": round(float(ms.max()), 2),
+        },
+        "memory": memory_mb(),
+    }
+
+
+def run_load(call, payloads, concurrency):
+    """Run `call(session, payload)` over all payloads on `concurrency` threads; returns a summary."""
+    local = threading.local()
+    errors = [0]
+
+    def timed(payload):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = call(session, payload)
+        except Exception:
+            ok = False
+        if not ok:
+            errors[0] += 1
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, payloads))
+    return summarize(latencies, time.perf_counter() - started, errors[0])
+
+
+def post_json(url):
+    def call(session, payload):
+        return session.post(url, json=payload, timeout=60).status_code == 200
+    return call
+
+
+def setup_environment(workdir, overpass_url, overpass_rps):
+    """Point every cache at a scratch directory and every remote service at a local fake."""
+    os.environ.update({
+        "OVERPASS_REQUESTS_PER_SECOND": str(overpass_rps),
+        "MY_API_KEY": "offline-benchmark",
+        "EMBEDDING_BACKEND": "hashing",
+        "INDEX_CACHE_DIR": os.path.join(workdir, "index"),
+        "RESPONSE_CACHE_PATH": os.path.join(workdir, "responses.sqlite3"),
+        "PARKING_TILE_CACHE_PATH": "",
+        "RULES_RELOAD_INTERVAL": "0",
+        "OVERPASS_URL": overpass_url,
+    })
+
+
+def load_chat_app(llm_latency, embed_latency):
+    import model
+    model.llm = FakeGenerativeModel(llm_latency)
+    model.embedding_model.inner = LatencyEmbeddings(embed_latency)
+    while not (model.rules_index_builder.ready or model.rules_index_builder.failed):
+        time.sleep(0.05)
+    if model.rules_index_builder.failed:
+        raise RuntimeError(f"Rules index failed to build: {model.rules_index_builder.error}")
+    return model
+
+
+def serve(app):
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def chat_scenarios(base_url, concurrency_levels, n_requests, batch_size):
+    results = []
+    route_id = requests.post(f"{base_url}/api/create-prompt", json={"roadData": ROAD_DATA}).json()["route_id"]
+
+    for concurrency in concurrency_levels:
+        results.append(dict(scenario="create_prompt", concurrency=concurrency, **run_load(
+            post_json(f"{base_url}/api/create-prompt"), [{"roadData": ROAD_DATA}] * n_requests, concurrency)))
+
+        results.append(dict(scenario="query_repeated", concurrency=concurrency, **run_load(
+            post_json(f"{base_url}/query"),
+            [{"query": QUESTIONS[0], "route_id": route_id}] * n_requests, concurrency)))
+
+        unique = [
+            {"query": f"{QUESTIONS[i % len(QUESTIONS)]} (case {concurrency}-{i})", "route_id": route_id, "bypass_cache": True}
+            for i in range(n_requests)
+        ]
+        results.append(dict(scenario="query_unique", concurrency=concurrency, **run_load(
+            post_json(f"{base_url}/query"), unique, concurrency)))
+
+        batches = [
+            {"queries": [f"{QUESTIONS[j % len(QUESTIONS)]} (batch {concurrency}-{i}-{j})" for j in range(batch_size)],
+             "route_id": route_id, "bypass_cache": True}
+            for i in range(max(1, n_requests // batch_size))
+        ]
+        results.append(dict(scenario="query_batch", concurrency=concurrency, batch_size=batch_size, **run_load(
+            post_json(f"{base_url}/query/batch"), batches, concurrency)))
+    return results
+
+
+def parking_scenarios(route_points, stub_server):
+    import app as parking_app
+    from tile_cache import TileCache
+
+    results = []
+    for n_points in route_points:
+        # Dense urban ends and a sparse rural middle; a fresh memory-only tile cache per route length
+        coordinates = synthetic_route(n_points)
+        processor = parking_app.ParkingDataProcessor(tile_cache=TileCache(path=None))
+        for phase in ("cold", "warm"):
+            served_before = stub_server.requests_served
+            started = time.perf_counter()
+            spots = processor.get_parking_along_route(coordinates)
+            elapsed = time.perf_counter() - started
+            results.append(dict(
+                scenario="parking", route_points=n_points, cache=phase, spots=len(spots),
+                overpass_requests=stub_server.requests_served - served_before,
+                **summarize([elapsed], elapsed),
+            ))
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=50, help="requests per scenario and concurrency level")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--route-points", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake Gemini call")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="seconds per fake embedding call")
+    parser.add_argument("--overpass-latency", type=float, default=0.05, help="seconds per stub Overpass response")
+    parser.add_argument("--overpass-rps", type=float, default=20.0,
+                        help="client rate limit towards the stub (production default: 2)")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["chat", "parking"])
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    stub_server, overpass_url = start_stub_server(latency=args.overpass_latency)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the rules PDF path is relative
+
+    with tempfile.TemporaryDirectory(prefix="bench-service-") as workdir:
+        setup_environment(workdir, overpass_url, args.overpass_rps)
+        results = []
+        if "chat" not in args.skip:
+            model = load_chat_app(args.llm_latency, args.embed_latency)
+            server, base_url = serve(model.app)
+            try:
+                results.extend(chat_scenarios(base_url, args.concurrency, args.requests, args.batch_size))
+            finally:
+                server.shutdown()
+        if "parking" not in args.skip:
+            results.extend(parking_scenarios(args.route_points, stub_server))
+
+    stub_server.shutdown()
+    report = {
+        "benchmark": "service",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
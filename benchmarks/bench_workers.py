@@ -0,0 +1,234 @@
+"""
+Multi-worker load test of the production server (wsgi.create_app under gunicorn.conf.py).
+
+Seeds the index cache with a synthetic rules index of --index-chunks chunks, then for each
+serving variant and worker count starts gunicorn, drives unique /query requests (fake Gemini
+and embedder, see fakes.py) and reports throughput, latency and the memory of the master
+and every worker:
+
+- rss_mb: resident memory, counting shared pages in full
+- uss_mb: private memory of the process, what each extra worker really costs
+- pss_mb: resident memory with shared pages split between the processes sharing them
+
+Variants: "preload" (the default config: index loaded before fork, memory-mapped),
+"mmap" (every worker loads the app, the vectors are mapped from one file) and "memory"
+(every worker reads its own copy of the index, as separate processes did before).
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --index-chunks 100000
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+VARIANTS = {
+    "preload": {"PRELOAD_APP": "1", "INDEX_MMAP": "1"},
+    "mmap": {"PRELOAD_APP": "0", "INDEX_MMAP": "1"},
+    "memory": {"PRELOAD_APP": "0", "INDEX_MMAP": "0"},
+}
+
+
+def create_bench_app():
+    """gunicorn app factory: the production app with Gemini and the embedder replaced by fakes."""
+    import wsgi
+    import model
+    from fakes import FakeGenerativeModel, LatencyEmbeddings
+
+    server = wsgi.create_app()
+    model.llm = FakeGenerativeModel(float(os.getenv("BENCH_LLM_LATENCY", 0.05)))
+    model.embedding_model.inner = LatencyEmbeddings(float(os.getenv("BENCH_EMBED_LATENCY", 0.01)), model.embedding_model.inner)
+    return server
+
+
+def seed_index(cache_dir, n_chunks, pdf_path):
+    """
+    Write a synthetic index for the rules PDF into the index cache, as if it had been built:
+    random vectors and chunk texts drawn from the PDF's vocabulary.
+    """
+    import numpy as np
+    from langchain_community.vectorstores import FAISS
+    from embedding_backends import create_embedding_model
+    from hybrid_retrieval import tokenize
+    from pdf_pages import PageTextCache, extract_pages
+    from rules_index import (CHUNK_OVERLAP, CHUNK_SIZE, INDEX_FORMAT_VERSION, _save_index, chunk_id,
+                             document_name, file_sha256, index_cache_key)
+
+    embedding, model_name = create_embedding_model()
+    pages = extract_pages(pdf_path, PageTextCache(os.path.join(cache_dir, "pages")))
+    vocabulary = sorted(set(tokenize(" ".join(text for _, text in pages))))
+    rng = random.Random(0)
+    texts = [f"{' '.join(rng.choices(vocabulary, k=60))} ({i})" for i in range(n_chunks)]
+    dimensions = len(embedding.embed_query("dimensions"))
+    vectors = np.random.default_rng(0).standard_normal((n_chunks, dimensions), dtype=np.float32)
+
+    name = document_name(pdf_path)
+    vectorstore = FAISS.from_embeddings(
+        list(zip(texts, vectors)), embedding,
+        metadatas=[{"source": name, "page": i // 10 + 1, "start": 0} for i in range(n_chunks)],
+        ids=[chunk_id(text, name) for text in texts],
+    )
+    _save_index(vectorstore, os.path.join(cache_dir, index_cache_key(model_name)), {
+        "version": INDEX_FORMAT_VERSION,
+        "documents": {name: file_sha256(pdf_path)},
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": model_name,
+        "chunks": n_chunks,
+        "last_update": {"reused": 0, "recomputed": n_chunks, "removed": 0},
+        "created_at": time.time(),
+    })
+    return vectors.nbytes
+
+
+def process_memory(pid):
+    """Rss, Pss and private (Uss) memory of a process in MB, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": round(fields.get("Rss", 0), 1),
+        "pss_mb": round(fields.get("Pss", 0), 1),
+        "uss_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1),
+    }
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def start_server(port, workers, threads, env):
+    command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+               "--threads", str(threads), "--bind", f"127.0.0.1:{port}", "bench_workers:create_bench_app()"]
+    return subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(base_url, process, workers, timeout):
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            # Every worker must answer: probe more times than there are workers
+            if all(requests.get(f"{base_url}/readyz", timeout=5).status_code == 200 for _ in range(4 * workers)) \
+                    and len(worker_pids(process.pid)) == workers:
+                return
+        except requests.exceptions.RequestException:
+            pass  # Not listening yet, or the master is still preparing the first fork
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready in time")
+
+
+def run_variant(variant, workers, args, env, port):
+    import requests
+    from bench_service import QUESTIONS, ROAD_DATA, post_json, run_load
+
+    env = dict(env, **VARIANTS[variant])
+    process = start_server(port, workers, args.threads, env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        started = time.perf_counter()
+        wait_ready(base_url, process, workers, args.startup_timeout)
+        startup_s = time.perf_counter() - started
+
+        route_id = requests.post(f"{base_url}/api/create-prompt", json={"roadData": ROAD_DATA}).json()["route_id"]
+        payloads = [
+            {"query": f"{QUESTIONS[i % len(QUESTIONS)]} ({variant}-{workers}-{i})", "route_id": route_id, "bypass_cache": True}
+            for i in range(args.requests)
+        ]
+        run_load(post_json(f"{base_url}/query"), payloads[:args.concurrency * 2], args.concurrency)  # warm up every worker
+        load = run_load(post_json(f"{base_url}/query"), payloads, args.concurrency)
+        load.pop("memory")
+
+        worker_memory = [process_memory(pid) for pid in worker_pids(process.pid)]
+        master_memory = process_memory(process.pid)
+        return dict(
+            variant=variant, workers=workers, startup_s=round(startup_s, 2), **load,
+            master=master_memory,
+            worker_mean={key: round(sum(m[key] for m in worker_memory) / len(worker_memory), 1) for key in master_memory},
+            total_pss_mb=round(master_memory["pss_mb"] + sum(m["pss_mb"] for m in worker_memory), 1),
+        )
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=4, help="gthread threads per worker")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--index-chunks", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake Gemini call")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="seconds per fake embedding call")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    from bench_service import git_revision
+
+    with tempfile.TemporaryDirectory(prefix="bench-workers-") as workdir:
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join([REPO_DIR, BENCH_DIR]),
+            MY_API_KEY="offline-benchmark",
+            EMBEDDING_BACKEND="hashing",
+            INDEX_CACHE_DIR=os.path.join(workdir, "index"),
+            RESPONSE_CACHE_PATH=os.path.join(workdir, "responses.sqlite3"),
+            ROAD_DATA_STORE_PATH=os.path.join(workdir, "routes.sqlite3"),
+            PARKING_TILE_CACHE_PATH="",
+            RULES_RELOAD_INTERVAL="0",
+            WORKER_THREADS=str(args.threads),
+            BENCH_LLM_LATENCY=str(args.llm_latency),
+            BENCH_EMBED_LATENCY=str(args.embed_latency),
+        )
+        os.environ.update(EMBEDDING_BACKEND="hashing", MY_API_KEY="offline-benchmark")
+        started = time.perf_counter()
+        vector_bytes = seed_index(env["INDEX_CACHE_DIR"], args.index_chunks, os.path.join(REPO_DIR, "Structured-Rules-data.pdf"))
+        print(f"Seeded a {args.index_chunks}-chunk index ({vector_bytes / 2 ** 20:.0f} MB of vectors) "
+              f"in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+        results = []
+        for variant in args.variants:
+            for workers in args.workers:
+                print(f"Running {variant} with {workers} worker(s)", file=sys.stderr)
+                results.append(run_variant(variant, workers, args, env, args.port))
+
+    report = {
+        "benchmark": "workers",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "cpu_count": os.cpu_count(),
+        "index_vectors_mb": round(vector_bytes / 2 ** 20, 1),
+        "config": vars(args),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
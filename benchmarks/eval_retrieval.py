@@ -0,0 +1,138 @@
+"""
+Offline retrieval evaluation: dense top-10 (the old /query behaviour) against BM25, dense
+and hybrid (RRF-fused, optionally reranked) retrieval cut to RETRIEVAL_K chunks.
+
+Each question in retrieval_eval.jsonl lists passages that answer it; a retrieved chunk is
+relevant when it contains one of them (case and whitespace insensitive). Reports hit rate,
+MRR and the rules text each mode would put into the prompt.
+
+The index is chunked as production chunks it (pdf_pages.create_page_chunks, CHUNK_SIZE);
+--chunk-size tries other sizes. Questions whose passage no chunk contains in full (it
+straddles a chunk or page boundary) cannot be hit by any mode: they count as misses and are
+reported as `unreachable`, with `reachable_hit_rate` scoring the others alone.
+
+    python benchmarks/eval_retrieval.py
+    python benchmarks/eval_retrieval.py --chunk-size 400
+    EMBEDDING_BACKEND=local RERANKER_MODEL=cross-encoder/ms-marco-MiniLM-L-6-v2 python benchmarks/eval_retrieval.py
+"""
+import os
+import re
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")  # Runs offline unless told otherwise
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from embedding_backends import create_embedding_model
+from hybrid_retrieval import DEFAULT_CANDIDATES, DEFAULT_RETRIEVAL_K, BM25Index, HybridRetriever, create_reranker
+from pdf_pages import PageTextCache, create_page_chunks, extract_pages
+from query_cache import RetrievalCache, search_chunk_ids
+from rules_index import CHUNK_OVERLAP, CHUNK_SIZE, IndexSnapshot, update_vector_store
+
+EVAL_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval_eval.jsonl")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text):
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+
+def build_index(pdf_path, chunk_size, chunk_overlap, embedding, cache_dir):
+    pages = extract_pages(pdf_path, PageTextCache(cache_dir))
+    metadata = {"source": os.path.basename(pdf_path)}
+    if (chunk_size, chunk_overlap) == (CHUNK_SIZE, CHUNK_OVERLAP):
+        chunks = create_page_chunks(pages, metadata)  # Exactly what production indexes
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        chunks = [
+            {"text": chunk, "metadata": dict(metadata, page=page)}
+            for page, text in pages
+            for chunk in splitter.split_text(text)
+        ]
+    vectorstore, _ = update_vector_store(None, chunks, embedding)
+    return vectorstore
+
+
+def score(questions, retrieve, reachable):
+    """Hit rate (over all questions and over the reachable ones), MRR and mean prompt characters of one mode."""
+    hits, reachable_hits, reciprocal_ranks, prompt_chars = 0, 0, 0.0, 0
+    for i, question in enumerate(questions):
+        texts = retrieve(question["question"])
+        prompt_chars += len("\n".join(texts))
+        for rank, text in enumerate(texts, 1):
+            if any(expected in normalize(text) for expected in question["expected"]):
+                hits += 1
+                reachable_hits += i in reachable
+                reciprocal_ranks += 1.0 / rank
+                break
+    n = len(questions)
+    return {
+        "hit_rate": round(hits / n, 3),
+        "reachable_hit_rate": round(reachable_hits / len(reachable), 3) if reachable else None,
+        "mrr": round(reciprocal_ranks / n, 3),
+        "mean_prompt_chars": round(prompt_chars / n),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="Structured-Rules-data.pdf")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=None, help="default: CHUNK_OVERLAP, at most a tenth of the chunk size")
+    parser.add_argument("--k", type=int, default=DEFAULT_RETRIEVAL_K)
+    parser.add_argument("--candidates", type=int, default=DEFAULT_CANDIDATES)
+    parser.add_argument("--cache-dir", default=os.path.join(os.getenv("INDEX_CACHE_DIR", ".index_cache"), "pages"))
+    args = parser.parse_args()
+    chunk_overlap = args.chunk_overlap if args.chunk_overlap is not None else min(CHUNK_OVERLAP, args.chunk_size // 10)
+
+    embedding, model_name = create_embedding_model()
+    vectorstore = build_index(args.pdf, args.chunk_size, chunk_overlap, embedding, args.cache_dir)
+    docstore = vectorstore.docstore
+    all_texts = [normalize(docstore.search(cid).page_content) for cid in vectorstore.index_to_docstore_id.values()]
+
+    with open(EVAL_SET) as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    # Passages split across chunk boundaries cannot be retrieved by any mode; they are still scored (as misses)
+    reachable = {i for i, q in enumerate(questions) if any(e in text for e in q["expected"] for text in all_texts)}
+    for i, question in enumerate(questions):
+        if i not in reachable:
+            print(f"Unreachable at chunk size {args.chunk_size}: {question['question']}", file=sys.stderr)
+
+    def dense(k):
+        return lambda query: [
+            docstore.search(cid).page_content
+            for cid in search_chunk_ids(vectorstore, [embedding.embed_query(query)], k)[0]
+        ]
+
+    bm25 = BM25Index.from_vectorstore(vectorstore)
+    snapshot = IndexSnapshot(vectorstore, 1, None)
+
+    def hybrid(reranker):
+        retriever = HybridRetriever(RetrievalCache(), embedding, k=args.k, candidates=args.candidates, reranker=reranker)
+        return lambda query: [doc.page_content for doc in retriever.retrieve(snapshot, query)]
+
+    modes = {
+        "dense@10": dense(10),
+        f"dense@{args.k}": dense(args.k),
+        f"bm25@{args.k}": lambda query: [docstore.search(cid).page_content for cid in bm25.search(query, args.k)],
+        f"hybrid@{args.k}": hybrid(None),
+    }
+    reranker = create_reranker()
+    if reranker is not None:
+        modes[f"hybrid+rerank@{args.k}"] = hybrid(reranker)
+
+    print(json.dumps({
+        "embedding_model": model_name,
+        "chunks": len(all_texts),
+        "chunk_size": args.chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "questions": len(questions),
+        "unreachable": len(questions) - len(reachable),
+        "modes": {name: score(questions, retrieve, reachable) for name, retrieve in modes.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Offline stand-ins for the Google services, for benchmarks: an embedder and a Gemini
+GenerativeModel that answer locally after a configurable delay.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+from embedding_backends import HashingEmbeddings
+
+
+class LatencyEmbeddings(Embeddings):
+    """Hashing embeddings that take `latency` seconds per call, like a remote embedding API."""
+
+    def __init__(self, latency: float = 0.0, inner: Embeddings = None):
+        self.latency = latency
+        self.inner = inner or HashingEmbeddings()
+        self.calls = 0
+
+    def embed_documents(self, texts, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.inner.embed_query(text)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in for genai.GenerativeModel: waits `latency` seconds (spread over the chunks
+    when streaming) and answers with a fixed-length text derived from the prompt.
+    """
+
+    def __init__(self, latency: float = 0.0, answer_words: int = 60, stream_chunks: int = 6, capacity: int = None):
+        self.latency = latency
+        self.answer_words = answer_words
+        self.stream_chunks = max(1, stream_chunks)
+        self.calls = 0
+        # Calls answered at once, like a per-key quota: further calls wait for a free slot
+        self.capacity = capacity
+        self._slots = threading.BoundedSemaphore(capacity) if capacity else None
+        self._async_slots = None
+
+    def _answer(self, prompt):
+        words = prompt.split()[-self.answer_words:] or ["ok"]
+        return " ".join(words)
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        answer = self._answer(prompt)
+        if not stream:
+            if self._slots is None:
+                time.sleep(self.latency)
+            else:
+                with self._slots:
+                    time.sleep(self.latency)
+            return FakeResponse(answer)
+        return self._stream(answer)
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        if self._slots is None:
+            await asyncio.sleep(self.latency)
+        else:
+            if self._async_slots is None:
+                self._async_slots = asyncio.Semaphore(self.capacity)
+            async with self._async_slots:
+                await asyncio.sleep(self.latency)
+        return FakeResponse(self._answer(prompt))
+
+    def _stream(self, answer):
+        words = answer.split()
+        step = -(-len(words) // self.stream_chunks)
+        for start in range(0, len(words), step):
+            time.sleep(self.latency / self.stream_chunks)
+            yield FakeResponse(" ".join(words[start:start + step]) + " ")
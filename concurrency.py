@@ -0,0 +1,274 @@
+import os
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Iterator, Tuple
+from telemetry import REGISTRY
+
+# Seconds a request may wait for a free slot before it is turned away with 429
+DEFAULT_QUEUE_TIMEOUT = 5.0
+
+# Seconds clients are asked to wait before retrying a request turned away with 429
+OVERLOAD_RETRY_AFTER = 2
+
+# Request threads per gunicorn worker (WORKER_THREADS, see gunicorn.conf.py)
+DEFAULT_WORKER_THREADS = 4
+
+ADMISSION_IN_USE = REGISTRY.gauge(
+    "atrip_admission_in_use", "Requests holding an admission slot.", ["limiter"])
+ADMISSION_WAITING = REGISTRY.gauge(
+    "atrip_admission_waiting", "Requests queued for an admission slot.", ["limiter"])
+ADMISSION_REJECTED = REGISTRY.counter(
+    "atrip_admission_rejected_total", "Requests turned away because no slot freed up in time.", ["limiter"])
+COALESCED = REGISTRY.counter(
+    "atrip_coalesced_requests_total", "Requests answered by joining an identical request already in flight.", ["flight"])
+
+
+def thread_bound_limit() -> int:
+    """
+    Default admission limit of the threaded servers. A gthread worker never has more than
+    WORKER_THREADS requests in flight, so a limit at or above that is never reached and
+    nothing is ever answered with 429. One less leaves a thread to take the request that
+    finds the limit reached (and to serve the other endpoints meanwhile).
+    """
+    return max(1, int(os.getenv("WORKER_THREADS", DEFAULT_WORKER_THREADS)) - 1)
+
+
+class Overloaded(Exception):
+    """No admission slot freed up within the queue timeout; answered with 429."""
+
+    def __init__(self, limiter: str, retry_after: int = OVERLOAD_RETRY_AFTER):
+        super().__init__(f"Too many {limiter} requests in progress, please retry shortly.")
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    At most `max_concurrent` requests run at once; the others queue for up to
+    `queue_timeout` seconds and are then rejected with Overloaded, so a burst is
+    answered with fast 429s instead of piling up behind a slow upstream.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    @contextmanager
+    def admit(self):
+        with ADMISSION_WAITING.track(limiter=self.name):
+            admitted = self._slots.acquire(timeout=self.queue_timeout)
+        if not admitted:
+            ADMISSION_REJECTED.inc(limiter=self.name)
+            raise Overloaded(self.name)
+        try:
+            with ADMISSION_IN_USE.track(limiter=self.name):
+                yield
+        finally:
+            self._slots.release()
+
+
+class AsyncAdmissionLimiter(AdmissionLimiter):
+    """AdmissionLimiter for coroutines on one event loop."""
+
+    def __init__(self, name: str, max_concurrent: int, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        super().__init__(name, max_concurrent, queue_timeout)
+        self._slots = None  # created on first use, inside the serving loop
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        try:
+            with ADMISSION_WAITING.track(limiter=self.name):
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTED.inc(limiter=self.name)
+            raise Overloaded(self.name)
+        try:
+            with ADMISSION_IN_USE.track(limiter=self.name):
+                yield
+        finally:
+            self._slots.release()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce identical calls in flight: the first caller for a key runs the function,
+    callers arriving before it finishes wait and share its result (or its exception).
+    Nothing is cached once the call completes. With `enabled` False every caller runs
+    the function itself.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable) -> Tuple[object, bool]:
+        """Returns (result, shared), `shared` being True for callers that joined another's call."""
+        if not self.enabled:
+            return fn(), False
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED.inc(flight=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class _Broadcast:
+    __slots__ = ("parts", "done", "error", "changed")
+
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.changed = threading.Condition()
+
+
+class FlightStream:
+    """
+    One caller's side of a StreamFlight call. The leader passes its items through `relay`;
+    followers read the same items, from the first one on, through `replay`. `close` must be
+    called once the caller is done (also when it never iterated), so the key is released.
+    """
+
+    def __init__(self, flight: "StreamFlight", key: Hashable, broadcast: _Broadcast, leader: bool):
+        self.flight = flight
+        self.key = key
+        self.leader = leader
+        self._broadcast = broadcast
+
+    def relay(self, items: Iterable) -> Iterator:
+        """Yield `items`, sharing each with the followers (leader only)."""
+        broadcast = self._broadcast
+        try:
+            for item in items:
+                with broadcast.changed:
+                    broadcast.parts.append(item)
+                    broadcast.changed.notify_all()
+                yield item
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish()
+
+    def replay(self) -> Iterator:
+        """Yield the leader's items as they come; raises what the leader's call raised (followers only)."""
+        broadcast, seen = self._broadcast, 0
+        while True:
+            with broadcast.changed:
+                while seen == len(broadcast.parts) and not broadcast.done:
+                    broadcast.changed.wait()
+                parts, done = broadcast.parts[seen:], broadcast.done
+            seen += len(parts)
+            yield from parts
+            if done and seen == len(broadcast.parts):
+                if broadcast.error is not None:
+                    raise broadcast.error
+                return
+
+    def close(self):
+        if self.leader:
+            self._finish(GeneratorExit())  # No-op once relay finished
+
+    def _finish(self, error: BaseException = None):
+        if error is not None and not isinstance(error, Exception):
+            # The leader stopped early (e.g. its client disconnected): followers get an error instead
+            error = RuntimeError(f"The shared {self.flight.name} request was abandoned.")
+        broadcast = self._broadcast
+        with broadcast.changed:
+            if broadcast.done:
+                return
+            broadcast.done = True
+            broadcast.error = error
+            broadcast.changed.notify_all()
+        self.flight._release(self.key, broadcast)
+
+
+class StreamFlight:
+    """
+    SingleFlight for streamed answers: the first caller for a key produces the items and
+    callers arriving before it finishes receive the same items as they are produced,
+    instead of producing their own. With `enabled` False every caller leads.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._broadcasts: Dict[Hashable, _Broadcast] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable) -> FlightStream:
+        if not self.enabled:
+            return FlightStream(self, None, _Broadcast(), leader=True)
+
+        with self._lock:
+            broadcast = self._broadcasts.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._broadcasts[key] = _Broadcast()
+        if not leader:
+            COALESCED.inc(flight=self.name)
+        return FlightStream(self, key, broadcast, leader)
+
+    def _release(self, key: Hashable, broadcast: _Broadcast):
+        with self._lock:
+            if self._broadcasts.get(key) is broadcast:
+                del self._broadcasts[key]
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    SingleFlight for coroutines on one event loop. The shared call runs as its own task,
+    so a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        super().__init__(name, enabled)
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        if not self.enabled:
+            return await fn(), False
+
+        task = self._tasks.get(key)
+        if task is not None:
+            COALESCED.inc(flight=self.name)
+            return await asyncio.shield(task), True
+
+        task = self._tasks[key] = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda done: self._tasks.pop(key) if self._tasks.get(key) is done else None)
+        return await asyncio.shield(task), False
+
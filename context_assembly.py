@@ -0,0 +1,223 @@
+import os
+import re
+import math
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+from rules_index import doc_chunk_id
+
+logger = logging.getLogger(__name__)
+
+# Prompt size limits, in estimated tokens (overridable through PROMPT_TOKEN_BUDGET and the share settings).
+# The road-data prompt and the question each get a share of the budget; the rules text gets the rest
+# plus whatever the other two leave unused. The question is never cut: a longer one goes over the budget.
+DEFAULT_TOKEN_BUDGET = 3000
+DEFAULT_ROAD_SHARE = 0.25
+DEFAULT_QUESTION_SHARE = 0.05
+
+# Gemini tokenizes English prose at roughly four characters per token
+CHARS_PER_TOKEN = 4
+
+# Chunks of the same page closer than this many characters are stitched into one span
+# (the splitter drops the whitespace it splits on, so neighbours are rarely exactly adjacent)
+MAX_MERGE_GAP = 2
+
+# Spans sharing this fraction of their word 5-grams with a better-ranked span are dropped
+NEAR_DUPLICATE_THRESHOLD = 0.8
+SHINGLE_SIZE = 5
+
+# A span cut to fit the budget is only kept if at least this many tokens of it fit
+MIN_TRUNCATED_TOKENS = 40
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut text to about `tokens` tokens, at the last whitespace before the limit."""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit + 1)
+    return text[:cut if cut > limit // 2 else limit].rstrip()
+
+
+@dataclass
+class TokenBudget:
+    total: int = DEFAULT_TOKEN_BUDGET
+    road_share: float = DEFAULT_ROAD_SHARE
+    question_share: float = DEFAULT_QUESTION_SHARE
+
+    @classmethod
+    def from_env(cls) -> "TokenBudget":
+        return cls(
+            total=int(os.getenv("PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+            road_share=float(os.getenv("PROMPT_ROAD_SHARE", DEFAULT_ROAD_SHARE)),
+            question_share=float(os.getenv("PROMPT_QUESTION_SHARE", DEFAULT_QUESTION_SHARE)),
+        )
+
+
+@dataclass
+class Span:
+    """A contiguous stretch of one page, built from one or more retrieved chunks."""
+    source: Optional[str]
+    page: Optional[int]
+    start: Optional[int]
+    end: Optional[int]
+    text: str
+    chunk_ids: List[str] = field(default_factory=list)
+    rank: int = 0  # best retrieval rank among its chunks
+    tokens: int = 0
+    truncated: bool = False
+
+    def to_dict(self) -> Dict:
+        return {
+            "source": self.source,
+            "page": self.page,
+            "start": self.start,
+            "end": self.end,
+            "chunk_ids": self.chunk_ids,
+            "tokens": self.tokens,
+            "truncated": self.truncated,
+        }
+
+
+@dataclass
+class AssembledContext:
+    rules_text: str
+    road_prompt: str
+    question: str
+    spans: List[Span]
+    tokens: Dict[str, int]
+    dropped_duplicates: int = 0
+    road_truncated: bool = False
+
+    def metadata(self) -> Dict:
+        """What went into the prompt, for the response metadata."""
+        return {
+            "spans": [span.to_dict() for span in self.spans],
+            "tokens": self.tokens,
+            "dropped_duplicates": self.dropped_duplicates,
+            "truncated": {"road": self.road_truncated, "rules": any(span.truncated for span in self.spans)},
+        }
+
+
+def merge_chunks(docs: Sequence) -> List[Span]:
+    """
+    Stitch retrieved chunks that overlap or touch on the same page back into contiguous
+    spans, so the chunker's overlap is not repeated in the prompt. Spans are ordered by
+    the best retrieval rank of their chunks; chunks without offsets stay on their own.
+    """
+    groups: Dict = {}
+    loose, seen = [], set()
+    for rank, doc in enumerate(docs):
+        cid = doc_chunk_id(doc)
+        if cid in seen:
+            continue
+        seen.add(cid)
+        meta = doc.metadata
+        span = Span(meta.get("source"), meta.get("page"), meta.get("start"), None, doc.page_content, [cid], rank)
+        if span.start is None:
+            loose.append(span)
+            continue
+        span.end = span.start + len(span.text)
+        groups.setdefault((span.source, span.page), []).append(span)
+
+    spans = list(loose)
+    for group in groups.values():
+        group.sort(key=lambda s: s.start)
+        current = group[0]
+        for span in group[1:]:
+            if span.start <= current.end + MAX_MERGE_GAP:
+                if span.end > current.end:
+                    overlap = current.end - span.start
+                    current.text += span.text[overlap:] if overlap >= 0 else "\n" + span.text
+                    current.end = span.end
+                current.chunk_ids.extend(span.chunk_ids)
+                current.rank = min(current.rank, span.rank)
+            else:
+                spans.append(current)
+                current = span
+        spans.append(current)
+
+    return sorted(spans, key=lambda s: s.rank)
+
+
+def _shingles(text: str) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def drop_near_duplicates(spans: List[Span], threshold: float = NEAR_DUPLICATE_THRESHOLD):
+    """
+    Drop spans that mostly repeat a better-ranked span (the same passage in two documents,
+    repeated boilerplate). Returns (kept spans, number dropped).
+    """
+    kept, kept_shingles = [], []
+    for span in spans:
+        shingles = _shingles(span.text)
+        if any(len(shingles & other) >= threshold * min(len(shingles), len(other)) for other in kept_shingles):
+            continue
+        kept.append(span)
+        kept_shingles.append(shingles)
+    return kept, len(spans) - len(kept)
+
+
+def assemble_context(docs: Sequence, road_prompt: str, question: str,
+                     budget: TokenBudget = None) -> AssembledContext:
+    """
+    Build the rules text of the prompt from the retrieved chunks (best first) within the
+    token budget: overlapping chunks are merged, near-duplicates dropped, and spans added
+    in rank order until the rules share is used up. The road prompt is cut to its share
+    only if it exceeds it (flagged in the metadata and logged). The question is sent whole;
+    beyond its share it goes over the budget rather than taking rules text.
+    """
+    budget = budget or TokenBudget()
+
+    road_limit = max(1, int(budget.total * budget.road_share))
+    road_truncated = estimate_tokens(road_prompt) > road_limit
+    if road_truncated:
+        logger.warning("Road data prompt cut from %d to %d tokens (PROMPT_ROAD_SHARE)", estimate_tokens(road_prompt), road_limit)
+        road_prompt = truncate_to_tokens(road_prompt, road_limit)
+    question_tokens, road_tokens = estimate_tokens(question), estimate_tokens(road_prompt)
+    question_reserved = min(question_tokens, max(1, int(budget.total * budget.question_share)))
+    remaining = max(0, budget.total - question_reserved - road_tokens)
+
+    spans, dropped = drop_near_duplicates(merge_chunks(docs))
+    selected = []
+    for span in spans:
+        tokens = estimate_tokens(span.text)
+        if tokens > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS:
+                break
+            span.text = truncate_to_tokens(span.text, remaining)
+            span.truncated = True
+            if span.start is not None:
+                span.end = span.start + len(span.text)
+            tokens = estimate_tokens(span.text)
+        span.tokens = tokens
+        remaining -= tokens
+        selected.append(span)
+
+    rules_text = "\n".join(span.text for span in selected)
+    rules_tokens = sum(span.tokens for span in selected)
+    return AssembledContext(
+        rules_text=rules_text,
+        road_prompt=road_prompt,
+        question=question,
+        spans=selected,
+        tokens={
+            "rules": rules_tokens,
+            "road": road_tokens,
+            "question": question_tokens,
+            "total": rules_tokens + road_tokens + question_tokens,
+            "budget": budget.total,
+        },
+        dropped_duplicates=dropped,
+        road_truncated=road_truncated,
+    )
@@ -0,0 +1,126 @@
+import os
+import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+GOOGLE_EMBEDDING_MODEL = "models/embedding-001"
+DEFAULT_LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_HASHING_DIMENSIONS = 384
+
+# Texts per embedding request and how many requests may run at once while indexing
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_WORKERS = 4
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embedder using the hashing trick.
+    Needs no model download or network access, so it is meant for tests and offline runs.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            # blake2b rather than hash() so vectors are stable across processes
+            digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimensions] += 1.0 if digest & (1 << 63) else -1.0
+
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Wrap an embedding model so documents are embedded in fixed-size batches,
+    spread across a thread pool. Order of the returned vectors matches the input.
+    """
+
+    def __init__(self, inner: Embeddings, batch_size: int = DEFAULT_BATCH_SIZE, max_workers: int = DEFAULT_WORKERS,
+                 query_kwargs: dict = None):
+        """
+        Args:
+            query_kwargs: Extra arguments to the inner `embed_documents` that make it embed
+                queries rather than documents (e.g. a task type); used by `embed_queries`
+        """
+        self.inner = inner
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.query_kwargs = query_kwargs or {}
+
+    def _embed_batched(self, texts, **kwargs):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1 or self.max_workers == 1:
+            results = [self.inner.embed_documents(batch, **kwargs) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = list(pool.map(lambda batch: self.inner.embed_documents(batch, **kwargs), batches))
+        return [vector for batch in results for vector in batch]
+
+    def embed_documents(self, texts):
+        return self._embed_batched(texts)
+
+    def embed_query(self, text):
+        return self.inner.embed_query(text)
+
+    def embed_queries(self, texts):
+        """
+        Embed several queries in batched requests instead of one call per query.
+        Gives the same vectors as `embed_query` on each text.
+        """
+        if len(texts) == 1:
+            return [self.embed_query(texts[0])]
+        return self._embed_batched(texts, **self.query_kwargs)
+
+
+def create_embedding_model(backend: str = None):
+    """
+    Build the embedding backend chosen by configuration.
+
+    Environment:
+        EMBEDDING_BACKEND: "google" (remote, default), "local" (sentence-transformers) or "hashing" (offline/tests)
+        LOCAL_EMBEDDING_MODEL: sentence-transformers model used by the local backend
+        HASHING_EMBEDDING_DIMENSIONS: vector size of the hashing backend
+        EMBEDDING_BATCH_SIZE / EMBEDDING_WORKERS: batching and parallelism used while indexing
+
+    Returns:
+        (embedding_model, model_name) where model_name identifies the vectors the
+        backend produces (it is part of the rules index cache key)
+    """
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "google")
+    query_kwargs = None
+
+    if backend == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        inner = GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL)
+        model_name = GOOGLE_EMBEDDING_MODEL
+        # embed_query uses the RETRIEVAL_QUERY task type; batched queries must match it
+        query_kwargs = {"task_type": "RETRIEVAL_QUERY"}
+    elif backend == "local":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        local_model = os.getenv("LOCAL_EMBEDDING_MODEL", DEFAULT_LOCAL_EMBEDDING_MODEL)
+        inner = HuggingFaceEmbeddings(model_name=local_model, encode_kwargs={"normalize_embeddings": True})
+        model_name = f"local:{local_model}"
+    elif backend == "hashing":
+        inner = HashingEmbeddings(int(os.getenv("HASHING_EMBEDDING_DIMENSIONS", DEFAULT_HASHING_DIMENSIONS)))
+        model_name = f"hashing:{inner.dimensions}"
+    else:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Use 'google', 'local' or 'hashing'.")
+
+    batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    max_workers = int(os.getenv("EMBEDDING_WORKERS", DEFAULT_WORKERS))
+    return BatchedEmbeddings(inner, batch_size, max_workers, query_kwargs), model_name
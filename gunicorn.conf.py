@@ -0,0 +1,47 @@
+"""
+gunicorn settings for wsgi.create_app: `gunicorn -c gunicorn.conf.py`.
+Workers default to one per core, each with a few threads for requests waiting on Gemini.
+"""
+import os
+import multiprocessing
+from concurrency import DEFAULT_WORKER_THREADS, thread_bound_limit
+
+# gRPC (used by the Google clients) must be told before it is imported that the process will fork
+os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "true")
+
+# Routes saved by one worker must be queryable through every other one
+os.environ.setdefault("ROAD_DATA_STORE_PATH", ".road_data.sqlite3")
+
+wsgi_app = "wsgi:create_app()"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("WORKER_THREADS", DEFAULT_WORKER_THREADS))
+timeout = 120  # Gemini answers can take a while
+graceful_timeout = 30
+
+# Load the app, and with it the rules index, once in the master; workers share it copy-on-write.
+# PRELOAD_APP=0 loads it in every worker instead (they still share the memory-mapped vectors).
+preload_app = os.getenv("PRELOAD_APP", "1") != "0"
+
+
+def when_ready(server):
+    # The admission limits only answer 429 while a thread is still free to take the request
+    # that finds them reached (see concurrency.thread_bound_limit)
+    for name in ("QUERY_MAX_CONCURRENCY", "PARKING_MAX_CONCURRENCY"):
+        limit = int(os.getenv(name, thread_bound_limit()))
+        if limit >= server.cfg.threads:
+            server.log.warning("%s=%d is not below the %d threads per worker: excess requests queue "
+                               "inside gunicorn instead of being answered with 429", name, limit, server.cfg.threads)
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        import wsgi
+        wsgi.prepare_fork()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        import wsgi
+        wsgi.reinitialize_worker()
@@ -0,0 +1,200 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+from query_cache import TTLCache, normalize_query
+from rules_index import doc_chunk_id
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Chunks sent to the LLM per query, and candidates each retriever contributes before fusion
+DEFAULT_RETRIEVAL_K = 4
+DEFAULT_CANDIDATES = 10
+
+# Standard BM25 parameters and the reciprocal-rank-fusion constant from Cormack et al.
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+# Keeps decimals and codes together: "3.2m", "a40", "b4009"
+TOKEN_PATTERN = re.compile(r"\w+(?:\.\w+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or should the to what when "
+    "where which who why with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index over the rules chunks with Okapi BM25 scoring.
+
+    The BM25 weight of every (term, chunk) posting does not depend on the query, so it
+    is computed once at build time; a search only sums the postings of the query terms.
+    """
+
+    def __init__(self, chunk_ids: Sequence[str], texts: Sequence[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.chunk_ids = list(chunk_ids)
+        postings: Dict[str, List] = {}
+        lengths = np.zeros(len(self.chunk_ids))
+
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        n = len(self.chunk_ids)
+        avg_length = lengths.mean() if n else 0.0
+        self.postings = {}
+        for term, entries in postings.items():
+            docs = np.fromiter((doc for doc, _ in entries), dtype=np.int64, count=len(entries))
+            tf = np.fromiter((tf for _, tf in entries), dtype=np.float64, count=len(entries))
+            idf = np.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+            norm = k1 * (1 - b + b * lengths[docs] / avg_length) if avg_length else k1
+            self.postings[term] = (docs, idf * tf * (k1 + 1) / (tf + norm))
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "BM25Index":
+        chunk_ids = list(vectorstore.index_to_docstore_id.values())
+        return cls(chunk_ids, [vectorstore.docstore.search(cid).page_content for cid in chunk_ids])
+
+    def search(self, query: str, k: int, keep: Callable[[str], bool] = None) -> List[str]:
+        """Ids of the k best-scoring chunks for a query (only chunks matching a query term)."""
+        scores = np.zeros(len(self.chunk_ids))
+        for term in set(tokenize(query)):
+            if term in self.postings:
+                docs, weights = self.postings[term]
+                scores[docs] += weights
+
+        results = []
+        for doc in np.argsort(-scores, kind="stable"):
+            if scores[doc] <= 0 or len(results) >= k:
+                break
+            cid = self.chunk_ids[doc]
+            if keep is None or keep(cid):
+                results.append(cid)
+        return results
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[str]:
+    """
+    Fuse ranked id lists: every list adds 1 / (k + rank) to an id's score.
+    Ids appearing high in several lists win; ties keep first-seen order.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: -scores[item])
+
+
+class CrossEncoderReranker:
+    """Local cross-encoder (sentence-transformers) scoring (question, chunk) pairs."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name)
+
+    def rerank(self, query: str, texts: Sequence[str]) -> List[int]:
+        """Positions of `texts` ordered best first."""
+        scores = self.model.predict([(query, text) for text in texts])
+        return [int(i) for i in np.argsort(-np.asarray(scores), kind="stable")]
+
+
+def create_reranker():
+    """
+    Optional reranker from RERANKER_MODEL (a sentence-transformers cross-encoder such as
+    "cross-encoder/ms-marco-MiniLM-L-6-v2"). Returns None when it is not configured.
+    """
+    model_name = os.getenv("RERANKER_MODEL")
+    return CrossEncoderReranker(model_name) if model_name else None
+
+
+class HybridRetriever:
+    """
+    Dense (FAISS) and lexical (BM25) retrieval fused with reciprocal-rank fusion, optionally
+    reranked, so only the few best chunks need to go into the prompt. Dense results come
+    through the RetrievalCache; the BM25 index is built once per index version.
+    """
+
+    def __init__(self, retrieval_cache, embedding_model, k: int = DEFAULT_RETRIEVAL_K,
+                 candidates: int = DEFAULT_CANDIDATES, reranker: Optional[CrossEncoderReranker] = None):
+        self.retrieval_cache = retrieval_cache
+        self.embedding_model = embedding_model
+        self.k = k
+        self.candidates = candidates
+        self.reranker = reranker
+        self.results = TTLCache(retrieval_cache.results.maxsize, retrieval_cache.results.ttl)
+        self._lexical: Dict[int, BM25Index] = {}  # index version -> BM25 index
+        self._lock = threading.Lock()
+
+    def lexical_index(self, snapshot) -> BM25Index:
+        with self._lock:
+            index = self._lexical.get(snapshot.version)
+            if index is None:
+                started = time.perf_counter()
+                index = BM25Index.from_vectorstore(snapshot.vectorstore)
+                # Keep the previous version too: requests started before a reload still use it
+                self._lexical = {v: i for v, i in self._lexical.items() if v == snapshot.version - 1}
+                self._lexical[snapshot.version] = index
+                logger.info("Built BM25 index over %d chunks in %.1f ms", len(index.chunk_ids), (time.perf_counter() - started) * 1000)
+            return index
+
+    def retrieve(self, snapshot, query: str, sources: Sequence[str] = None):
+        """
+        Top-k rules chunks (as Documents) for a query against one index snapshot,
+        optionally restricted to some source documents.
+        """
+        return self.retrieve_many(snapshot, [query], sources)[0]
+
+    def retrieve_many(self, snapshot, queries: Sequence[str], sources: Sequence[str] = None):
+        """
+        `retrieve` for several queries: the dense side embeds and searches all uncached
+        queries in one batch (see RetrievalCache.retrieve_many). Returns one list per query.
+        """
+        vectorstore = snapshot.vectorstore
+        sources = tuple(sorted(set(sources))) if sources else None
+        keys = [(normalize_query(query), snapshot.version, sources, self.k) for query in queries]
+        results = [self.results.get(key) for key in keys]
+        missing = [i for i, chunk_ids in enumerate(results) if chunk_ids is None]
+
+        if missing:
+            keep = None
+            if sources:
+                keep = lambda cid: vectorstore.docstore.search(cid).metadata.get("source") in sources
+
+            dense = self.retrieval_cache.retrieve_many(vectorstore, snapshot.version, [queries[i] for i in missing],
+                                                       self.candidates, self.embedding_model, sources)
+            lexical_index = self.lexical_index(snapshot)
+            for i, dense_docs in zip(missing, dense):
+                with span("bm25_search"):
+                    lexical = lexical_index.search(queries[i], self.candidates, keep)
+                chunk_ids = reciprocal_rank_fusion([[doc_chunk_id(doc) for doc in dense_docs], lexical])
+
+                if self.reranker is not None and chunk_ids:
+                    texts = [vectorstore.docstore.search(cid).page_content for cid in chunk_ids]
+                    with span("rerank"):
+                        chunk_ids = [chunk_ids[j] for j in self.reranker.rerank(queries[i], texts)]
+
+                results[i] = chunk_ids[:self.k]
+                self.results.put(keys[i], results[i])
+
+        return [[vectorstore.docstore.search(cid) for cid in chunk_ids] for chunk_ids in results]
+
+    def stats(self):
+        return {
+            "k": self.k,
+            "candidates": self.candidates,
+            "reranker": getattr(self.reranker, "model_name", None),
+            "fused_results": self.results.stats(),
+        }
@@ -1,21 +1,37 @@
 import os
 import json
-from flask import Flask, request, jsonify
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import time
+import logging
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
 import google.generativeai as genai
 from flask_cors import CORS
 from dotenv import load_dotenv
+from embedding_backends import create_embedding_model
+from pdf_pages import create_page_chunks, extract_pages
+from query_cache import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL, RetrievalCache, normalize_query
+from hybrid_retrieval import DEFAULT_CANDIDATES, DEFAULT_RETRIEVAL_K, HybridRetriever, create_reranker
+from context_assembly import TokenBudget, assemble_context
+from response_cache import create_response_cache, response_scope
+from road_data_store import create_road_data_store
+from concurrency import DEFAULT_QUEUE_TIMEOUT, AdmissionLimiter, Overloaded, SingleFlight, StreamFlight, thread_bound_limit
+from telemetry import REGISTRY, UPSTREAM_IN_FLIGHT, cache_collector, configure_logging, in_request_context, instrument_app, span
+from rules_index import (
+    DEFAULT_RELOAD_INTERVAL, BackgroundIndexBuilder, CorpusWatcher,
+    doc_chunk_id, document_name, load_or_build_vector_store, rules_documents, update_vector_store,
+)
 
 # Workaround to prevent OpenMP error
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# Chat API routes; served on their own by the app at the bottom of this file (python model.py)
+# or together with the parking page by wsgi.create_app
+chat_api = Blueprint("chat", __name__)
+
+# Per-request logs go through logging (LOG_LEVEL); request prompts and answers only at DEBUG
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file (for API_KEY and other sensitive details)
 load_dotenv()
@@ -29,44 +45,74 @@ if not API_KEY:
     raise ValueError("API Key is not set. Please add your API Key to the .env file.")
 genai.configure(api_key=API_KEY)
 
-# Initialize embedding model (Google Generative AI Embeddings)
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+# Initialize embedding model (backend chosen by EMBEDDING_BACKEND: google, local or hashing)
+embedding_model, EMBEDDING_MODEL_NAME = create_embedding_model()
 
-# Path to PDFs
-RULES_PDF_PATH = "Structured-Rules-data.pdf"  # Update with the actual rules PDF path
+# Initialize the LLM once rather than per request
+LLM_MODEL_NAME = "gemini-1.5-pro-002"
+llm = genai.GenerativeModel(LLM_MODEL_NAME)
 
-# Utility Functions
-def load_pdf_text(pdf_path):
-    """
-    Extract text content from a PDF file.
-    """
-    pdf_reader = PdfReader(pdf_path)
-    return "".join([page.extract_text() for page in pdf_reader.pages])
+# Seconds clients are asked to wait before retrying while the rules index is building
+INDEX_RETRY_AFTER = 5
 
-def create_chunks(text):
-    """
-    Splits text into manageable chunks using a RecursiveCharacterTextSplitter.
-    """
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-    return [{"text": chunk} for chunk in text_splitter.split_text(text)]
+# Rules chunks sent to the LLM per query, and candidates the dense and BM25 retrievers each contribute
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", DEFAULT_RETRIEVAL_K))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", DEFAULT_CANDIDATES))
+
+# /query/batch limits: questions per request and Gemini calls in flight per request
+MAX_BATCH_QUERIES = 50
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 4))
+
+# /query admission: questions answered at once per process (by default one less than the
+# request threads, see thread_bound_limit), and seconds the others queue before a 429
+QUERY_MAX_CONCURRENCY = int(os.getenv("QUERY_MAX_CONCURRENCY", thread_bound_limit()))
+QUERY_QUEUE_TIMEOUT = float(os.getenv("QUERY_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT))
 
-def create_vector_store(rules_text):
+# Identical /query requests in flight share one retrieval and Gemini call (QUERY_COALESCE=0 disables)
+QUERY_COALESCE = os.getenv("QUERY_COALESCE", "1") != "0"
+
+# Token budget of the final prompt, split between rules text, road data and question
+prompt_budget = TokenBudget.from_env()
+
+# Path to PDFs
+RULES_PDF_PATH = "Structured-Rules-data.pdf"  # Used when RULES_CORPUS_DIR is not set
+
+# Utility Functions
+def create_vector_store(rules_documents, previous=None, progress=None):
     """
-    Create a FAISS vector store for the rules.
+    Create a FAISS vector store for the rules from (document name, pages) pairs,
+    pages being (page number, text) pairs. Each chunk records its document as `source`.
+    Chunks already embedded in `previous` are reused; only new chunks are embedded.
+    Returns the store and a report of reused/recomputed/removed embeddings.
     """
-    rules_chunks = create_chunks(rules_text)
-    texts = [chunk["text"] for chunk in rules_chunks]
-    metadatas = [{"source": "rules"}] * len(rules_chunks)
-    return FAISS.from_texts(texts=texts, embedding=embedding_model, metadatas=metadatas)
+    rules_chunks = []
+    for name, pages in rules_documents:
+        rules_chunks.extend(create_page_chunks(pages, {"source": name}))
+    return update_vector_store(previous, rules_chunks, embedding_model, progress)
 
 def generate_response(prompt):
     """
     Generate a response using the Gemini Pro model.
     """
-    model = genai.GenerativeModel("gemini-1.5-pro-002")
-    response = model.generate_content(prompt)
+    with span("llm"), UPSTREAM_IN_FLIGHT.track(upstream="gemini"):
+        response = llm.generate_content(prompt)
     return response.text.strip()
 
+def stream_response(prompt):
+    """
+    Generate a response with the Gemini Pro model, yielding text as it is produced.
+    The `llm_stream` stage also covers the time the client takes to read each chunk.
+    """
+    with span("llm_stream"), UPSTREAM_IN_FLIGHT.track(upstream="gemini"):
+        for chunk in llm.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks carrying only finish/safety metadata have no text
+                continue
+            if text:
+                yield text
+
 def generate_prompt_from_json(json_data):
     """
     Generate a prompt sentence based on the JSON data.
@@ -92,14 +138,120 @@ def generate_prompt_from_json(json_data):
 
     return " ".join(road_info)
 
-# Load rules PDF content and create the vector store
-rules_text = load_pdf_text(RULES_PDF_PATH)
-vectorstore = create_vector_store(rules_text)
+def build_rules_index(progress):
+    """
+    Load the rules vector store from the on-disk index cache, building it from the rules PDFs
+    (every PDF in RULES_CORPUS_DIR, or RULES_PDF_PATH) when they changed.
+    """
+    def build(pdf_paths, previous, progress):
+        documents = [(document_name(path), extract_pages(path, progress=progress)) for path in pdf_paths]
+        return create_vector_store(documents, previous, progress)
+
+    return load_or_build_vector_store(rules_documents(RULES_PDF_PATH), embedding_model, EMBEDDING_MODEL_NAME, build, progress=progress)
+
+# Build the rules index in the background so the server can start serving straight away
+rules_index_builder = BackgroundIndexBuilder(build_rules_index).start()
+
+# Rebuild and swap in the index when rules PDFs are added, changed or removed (RULES_RELOAD_INTERVAL=0 disables)
+RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", DEFAULT_RELOAD_INTERVAL))
+if RULES_RELOAD_INTERVAL > 0:
+    rules_corpus_watcher = CorpusWatcher(lambda: rules_documents(RULES_PDF_PATH), rules_index_builder.refresh,
+                                         interval=RULES_RELOAD_INTERVAL).start()
+
+# Cache query embeddings and retrieval results; repeated questions skip both the embedding call and the search
+retrieval_cache = RetrievalCache(
+    maxsize=int(os.getenv("QUERY_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", DEFAULT_CACHE_TTL)),
+)
+
+# Dense + BM25 retrieval fused by rank, optionally reranked (RERANKER_MODEL), keeping only the best chunks
+rules_retriever = HybridRetriever(retrieval_cache, embedding_model, k=RETRIEVAL_K,
+                                  candidates=RETRIEVAL_CANDIDATES, reranker=create_reranker())
+
+# Persistent cache of LLM answers (exact prompt match, or a similar question on the same road data)
+response_cache = create_response_cache(LLM_MODEL_NAME)
+
+# Road data per scanned route, with its prompt generated once at save time
+road_data_store = create_road_data_store()
+
+# Bounded /query concurrency (shared with /query/stream and the Gemini calls of /query/batch),
+# and coalescing of identical questions on the same road data
+query_limiter = AdmissionLimiter("query", QUERY_MAX_CONCURRENCY, QUERY_QUEUE_TIMEOUT)
+query_flights = SingleFlight("query", enabled=QUERY_COALESCE)
+query_stream_flights = StreamFlight("query_stream", enabled=QUERY_COALESCE)
+
+# Sections of /cache/stats. The lambdas read the module globals, which wsgi.reinitialize_worker
+# replaces in forked worker processes
+cache_stats_providers = {
+    "retrieval": lambda: retrieval_cache.stats(),
+    "hybrid": lambda: rules_retriever.stats(),
+    "responses": lambda: response_cache.stats(),
+    "routes": lambda: road_data_store.stats(),
+}
+
+REGISTRY.register_collector(cache_collector({
+    "query_embeddings": lambda: retrieval_cache.embeddings.stats(),
+    "retrieval_results": lambda: retrieval_cache.results.stats(),
+    "fused_results": lambda: rules_retriever.results.stats(),
+    "responses": lambda: response_cache.stats(),
+    "routes": lambda: road_data_store.stats(),
+}))
+
+@chat_api.errorhandler(Overloaded)
+def overloaded(error):
+    """
+    Backpressure: no admission slot freed up in time, ask the client to retry shortly.
+    """
+    response = jsonify({"error": str(error)})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 429
+
+@chat_api.route("/healthz")
+def healthz():
+    """
+    Liveness probe: the process is up and the index build has not failed.
+    """
+    status = rules_index_builder.status()
+    return jsonify(status), 503 if rules_index_builder.failed else 200
 
-@app.route("/api/create-prompt", methods=["POST"])
+@chat_api.route("/readyz")
+def readyz():
+    """
+    Readiness probe: only ready once the rules index can answer queries.
+    """
+    status = rules_index_builder.status()
+    return jsonify(status), 200 if rules_index_builder.ready else 503
+
+@chat_api.route("/cache/stats")
+def cache_stats():
+    """
+    Hit/miss counters of the query caches and the road-data store.
+    """
+    return jsonify({name: stats() for name, stats in cache_stats_providers.items()})
+
+@chat_api.route("/rules/documents")
+def rules_documents_list():
+    """
+    Documents in the served rules index with their chunk counts, for filtering queries by `sources`.
+    """
+    index = rules_index_builder.snapshot()
+    if index.vectorstore is None:
+        return jsonify({"error": "Rules index is not ready yet.", "index": rules_index_builder.status()}), 503
+
+    chunks = {}
+    for cid in index.vectorstore.index_to_docstore_id.values():
+        name = index.vectorstore.docstore.search(cid).metadata.get("source")
+        chunks[name] = chunks.get(name, 0) + 1
+    return jsonify({
+        "version": index.version,
+        "documents": [{"name": name, "chunks": count} for name, count in sorted(chunks.items())],
+    })
+
+@chat_api.route("/api/create-prompt", methods=["POST"])
 def save_road_data():
     """
     API endpoint to save road data sent from the frontend.
+    Returns a route id that /query uses to find this road data again.
     """
     data = request.get_json()
     road_data = data.get("roadData", "")
@@ -107,55 +259,371 @@ def save_road_data():
     if not road_data:
         return jsonify({"error": "Road data is required."}), 400
 
-    print(f"Received road data: {road_data}")  # Debug log
+    logger.debug("Received road data: %s", road_data)
 
-    # Simulate saving road data
-    with open("road_data.json", "w") as f:
-        f.write(json.dumps(road_data, indent=4))
+    # Generate the prompt once here rather than on every query
+    try:
+        prompt = generate_prompt_from_json(road_data)
+    except (KeyError, TypeError):
+        return jsonify({"error": "Road data is malformed."}), 400
 
-    return jsonify({"message": "Road data saved successfully."}), 200
+    route_id = road_data_store.save(road_data, prompt)
 
-@app.route("/query", methods=["POST"])
-def query_documents():
+    return jsonify({"message": "Road data saved successfully.", "route_id": route_id}), 200
+
+def sse_event(event, payload):
     """
-    API endpoint to query documents and retrieve responses.
+    Format one Server-Sent Event frame.
     """
-    data = request.get_json()
-    query = data.get("query", "")
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-    if not query:
-        return jsonify({"error": "Query is required"}), 400
+def check_route(data):
+    """
+    Checks shared by every query endpoint: the rules index is ready, and the route and the
+    optional source filter are valid. Loads the route's road data once. Framework-neutral,
+    so async_server.py can use it too.
 
-    print(f"Received query: {query}")  # Debug log
+    Returns:
+        ((index snapshot, road-data prompt, sources), None), or (None, (payload, status, headers)) on failure
+    """
+    # One consistent view of the index for the whole request, even if a reload swaps it meanwhile
+    index = rules_index_builder.snapshot()
+    if index.vectorstore is None:
+        payload = {"error": "Rules index is not ready yet.", "index": rules_index_builder.status()}
+        return None, (payload, 503, {"Retry-After": str(INDEX_RETRY_AFTER)})
+
+    # Look up the road data (and its precomputed prompt) for this route
+    route_id = data.get("route_id", "")
+    if not route_id or not isinstance(route_id, str):
+        return None, ({"error": "route_id is required and must be a string."}, 400, {})
+
+    # Optionally restrict retrieval to some rules documents (see /rules/documents)
+    sources = data.get("sources") or None
+    if sources is not None and not (isinstance(sources, list) and all(isinstance(name, str) for name in sources)):
+        return None, ({"error": "sources must be a list of document names."}, 400, {})
+
+    with span("road_data_load"):
+        route = road_data_store.get(route_id)
+    if route is None:
+        return None, ({"error": "No road data available for this route. Please scan it again."}, 404, {})
+
+    return (index, route["prompt"], sources), None
+
+def resolve_route(data):
+    """
+    check_route for the Flask endpoints.
 
-    # Simulate loading road data
-    try:
-        with open("road_data.json", "r") as f:
-            road_data = json.load(f)
-    except FileNotFoundError:
-        return jsonify({"error": "No road data available."}), 400
+    Returns:
+        ((index snapshot, road-data prompt, sources), None), or (None, (response, status)) on failure
+    """
+    resolved, failure = check_route(data)
+    if failure:
+        return None, error_response(failure)
+    return resolved, None
+
+def error_response(failure):
+    """
+    Flask (response, status) for a (payload, status, headers) failure of check_route or check_query.
+    """
+    payload, status, headers = failure
+    response = jsonify(payload)
+    response.headers.update(headers)
+    return response, status
+
+def check_query(data):
+    """
+    Validation shared by /query and /query/stream, on the Flask and the async server alike:
+    the question is a non-empty string, bypass_cache (if given) a JSON boolean, and
+    check_route passes.
+
+    Returns:
+        ((index, prompt, sources, query, bypass_cache, started), None), the arguments of
+        retrieve_context and answer_query, or (None, (payload, status, headers)) on failure
+    """
+    started = time.perf_counter()
+    if not isinstance(data, dict):
+        return None, ({"error": "The request body must be a JSON object."}, 400, {})
+    query = data.get("query", "")
+    bypass_cache = data.get("bypass_cache", False)
+
+    if not query or not isinstance(query, str):
+        return None, ({"error": "Query is required and must be a string."}, 400, {})
+    if not isinstance(bypass_cache, bool):
+        return None, ({"error": "bypass_cache must be true or false."}, 400, {})
+
+    resolved, failure = check_route(data)
+    if failure:
+        return None, failure
+    index, prompt, sources = resolved
 
-    # Generate the prompt from the road data
-    prompt = generate_prompt_from_json(road_data)
-    print(f"Generated prompt: {prompt}")  # Debug log
+    logger.debug("Received query: %s", query)
+    return (index, prompt, sources, query, bypass_cache, started), None
 
-    # Retrieve relevant documents
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 10})
-    relevant_docs = retriever.get_relevant_documents(query)
-    combined_text = "\n".join([doc.page_content for doc in relevant_docs])
+def build_query_context(index, prompt, query, relevant_docs, sources, bypass_cache, started):
+    """
+    Turn the retrieved rules for one question into the final prompt and its cache keys.
+    Returns None when no relevant rules text was found.
+    """
+    with span("prompt_build"):
+        # Stitch overlapping chunks together, drop near-duplicates and fit everything into the token budget
+        assembled = assemble_context(relevant_docs, prompt, query, prompt_budget)
 
-    if not combined_text.strip():
-        return jsonify({"response": "No relevant information found."}), 200
+    if not assembled.rules_text.strip():
+        return None
 
     # Formulate the final prompt
-    final_prompt = f"Based on the following information:\n\n{combined_text}\n\nAnd considering the road data:\n\n{prompt}\n\nAnswer the query: {query}"
+    final_prompt = f"Based on the following information:\n\n{assembled.rules_text}\n\nAnd considering the road data:\n\n{assembled.road_prompt}\n\nAnswer the query: {assembled.question}"
+
+    return {
+        "query": query,
+        "bypass_cache": bypass_cache,
+        "final_prompt": final_prompt,
+        "source_ids": [doc_chunk_id(doc) for doc in relevant_docs],
+        "citations": [dict(doc.metadata, chunk_id=doc_chunk_id(doc)) for doc in relevant_docs],
+        "context": assembled.metadata(),
+        "query_embedding": retrieval_cache.embed_query(query, embedding_model),
+        "scope": response_scope(prompt, index.fingerprint, EMBEDDING_MODEL_NAME, LLM_MODEL_NAME, *sorted(set(sources or []))),
+        "started": started,
+        "retrieval_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+def retrieve_context(index, prompt, sources, query, bypass_cache, started):
+    """
+    Retrieve the rules for one question and build its final prompt (see build_query_context).
+    """
+    # Retrieve relevant documents: dense + BM25, fused and cut to RETRIEVAL_K (cached per query and index version)
+    relevant_docs = rules_retriever.retrieve(index, query, sources)
+    return build_query_context(index, prompt, query, relevant_docs, sources, bypass_cache, started)
+
+def query_flight_key(index, prompt, sources, query, bypass_cache):
+    """
+    Requests with equal keys get the same answer, so one in flight can answer them all.
+    """
+    return index.version, prompt, normalize_query(query), tuple(sorted(set(sources or []))), bypass_cache
+
+def cached_response(context):
+    """
+    Cached answer for the same prompt, or a near-identical question on the same road data.
+    Returns (response, tier) or (None, None).
+    """
+    if context["bypass_cache"]:
+        return None, None
+    with span("response_cache"):
+        return response_cache.get(context["final_prompt"], context["scope"], context["query_embedding"])
+
+def answer_query(index, prompt, sources, query, bypass_cache, started):
+    """
+    Second half of /query: retrieve, then answer from the response cache or Gemini.
+    Holds a query admission slot throughout; raises Overloaded when none frees up in time.
+    Returns the response payload.
+    """
+    with query_limiter.admit():
+        context = retrieve_context(index, prompt, sources, query, bypass_cache, started)
+        if context is None:
+            return {"response": "No relevant information found."}
+
+        response_text, cache_tier = cached_response(context)
+        if response_text is not None:
+            return {"response": response_text, "cached": cache_tier, "sources": context["citations"], "context": context["context"]}
+
+        # Generate a response using the final prompt
+        response_text = generate_response(context["final_prompt"])
+        response_cache.put(context["final_prompt"], context["scope"], context["query_embedding"], response_text)
+
+    logger.debug("Response from backend: %s", response_text)
+
+    return {"response": response_text, "sources": context["citations"], "context": context["context"]}
+
+def stream_answer(context):
+    """
+    Stream Gemini's answer to a query context, then store the whole answer in the response cache.
+    Raises ValueError when no text was produced at all (e.g. the answer was blocked).
+    """
+    parts = []
+    for text in stream_response(context["final_prompt"]):
+        parts.append(text)
+        yield text
+
+    response_text = "".join(parts).strip()
+    if not response_text:
+        # Every chunk was blocked or carried no text: an error for the client, and nothing to cache
+        raise ValueError("Gemini returned no text.")
+    response_cache.put(context["final_prompt"], context["scope"], context["query_embedding"], response_text)
+
+@chat_api.route("/query", methods=["POST"])
+def query_documents():
+    """
+    API endpoint to query documents and retrieve responses.
 
-    # Generate a response using the final prompt
-    response_text = generate_response(final_prompt)
+    The same question about the same road data, asked again while the first is still being
+    answered, waits for that answer (marked "coalesced") instead of querying Gemini again.
+    """
+    parsed, failure = check_query(request.get_json())
+    if failure:
+        return error_response(failure)
+    index, prompt, sources, query, bypass_cache, started = parsed
+
+    payload, coalesced = query_flights.do(
+        query_flight_key(index, prompt, sources, query, bypass_cache),
+        lambda: answer_query(*parsed),
+    )
+    if coalesced:
+        payload = dict(payload, coalesced=True)
+    return jsonify(payload)  # Send the response back to the frontend
+
+@chat_api.route("/query/batch", methods=["POST"])
+def query_documents_batch():
+    """
+    Answer several questions about one route: {"route_id": ..., "queries": [...]}, plus the
+    optional `sources` and `bypass_cache` of /query.
 
-    print(f"Response from backend: {response_text}")  # Debug log
+    The road data is loaded once, the questions are embedded and searched in one batch, and
+    uncached answers are generated concurrently, at most BATCH_LLM_CONCURRENCY at a time.
+    Results come back in question order, each with its own timing.
+    """
+    started = time.perf_counter()
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "The request body must be a JSON object."}), 400
+    queries = data.get("queries")
+    bypass_cache = data.get("bypass_cache", False)
+
+    if not isinstance(bypass_cache, bool):
+        return jsonify({"error": "bypass_cache must be true or false."}), 400
+    if not isinstance(queries, list) or not queries or not all(isinstance(query, str) and query for query in queries):
+        return jsonify({"error": "queries must be a non-empty list of questions."}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch."}), 400
+
+    resolved, early_response = resolve_route(data)
+    if early_response:
+        return early_response
+    index, prompt, sources = resolved
+
+    logger.debug("Received %d batched queries", len(queries))
+
+    # One batched embedding call and one FAISS search for every uncached question
+    docs_per_query = rules_retriever.retrieve_many(index, queries, sources)
+    contexts = [
+        build_query_context(index, prompt, query, docs, sources, bypass_cache, started)
+        for query, docs in zip(queries, docs_per_query)
+    ]
+    retrieval_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    def answer(query, context):
+        if context is None:
+            return {"query": query, "response": "No relevant information found."}
+
+        llm_started = time.perf_counter()
+        result = {"query": query, "sources": context["citations"], "context": context["context"]}
+        response_text, cache_tier = cached_response(context)
+        if response_text is not None:
+            result.update(response=response_text, cached=cache_tier)
+        else:
+            try:
+                # Each Gemini call of a batch takes a /query admission slot
+                with query_limiter.admit():
+                    response_text = generate_response(context["final_prompt"])
+            except Overloaded as e:
+                result["error"] = str(e)
+            except Exception as e:
+                logger.warning("Error generating a batched response: %s", e)
+                result["error"] = "Failed to generate a response."
+            else:
+                response_cache.put(context["final_prompt"], context["scope"], context["query_embedding"], response_text)
+                result["response"] = response_text
+
+        result["timing"] = {
+            "llm_ms": round((time.perf_counter() - llm_started) * 1000, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(BATCH_LLM_CONCURRENCY, len(queries))) as pool:
+        results = list(pool.map(in_request_context(answer), queries, contexts))
+
+    return jsonify({
+        "results": results,
+        "timing": {
+            "retrieval_ms": retrieval_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        },
+    })
+
+@chat_api.route("/query/stream", methods=["POST"])
+def query_documents_stream():
+    """
+    Streaming variant of /query using Server-Sent Events.
 
-    return jsonify({"response": response_text})  # Send the response back to the frontend
+    Emits a `sources` event with the retrieved chunk ids, their source/page and the spans and
+    token counts that went into the prompt, then `token` events as Gemini
+    produces text, and a final `done` event with timing metadata (or `error`).
+
+    Like /query, the stream holds a query admission slot (429 when none frees up in time),
+    and the same question asked while it is being answered replays that answer's tokens
+    (marked "coalesced" in `done`) instead of querying Gemini again.
+    """
+    parsed, failure = check_query(request.get_json())
+    if failure:
+        return error_response(failure)
+
+    flight = query_stream_flights.join(query_flight_key(*parsed[:5]))
+    # Released when the response is closed, i.e. after the last event or when the client goes away
+    resources = ExitStack()
+    resources.callback(flight.close)
+    try:
+        if flight.leader:
+            resources.enter_context(query_limiter.admit())
+        context = retrieve_context(*parsed)
+    except BaseException:
+        resources.close()
+        raise
+    if context is None:
+        resources.close()
+        return jsonify({"response": "No relevant information found."})
+
+    def events():
+        yield sse_event("sources", {"chunk_ids": context["source_ids"], "citations": context["citations"], "context": context["context"]})
+
+        cache_tier, first_token_ms = None, None
+        try:
+            if flight.leader:
+                response_text, cache_tier = cached_response(context)
+                texts = flight.relay([response_text] if response_text is not None else stream_answer(context))
+            else:
+                texts = flight.replay()
+            for text in texts:
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - context["started"]) * 1000, 1)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            logger.warning("Error streaming response: %s", e)
+            yield sse_event("error", {"error": "Failed to generate a response."})
+            return
+
+        done = {
+            "cached": cache_tier,
+            "timing": {
+                "retrieval_ms": context["retrieval_ms"],
+                "time_to_first_token_ms": first_token_ms,
+                "total_ms": round((time.perf_counter() - context["started"]) * 1000, 1),
+            },
+        }
+        if not flight.leader:
+            done["coalesced"] = True
+        yield sse_event("done", done)
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # Stop proxies from buffering the stream
+    response.call_on_close(resources.close)
+    return response
+
+# Standalone chat API app (development server below; see wsgi.py for production serving)
+app = Flask(__name__)
+CORS(app)  # Enable CORS for all routes
+instrument_app(app)  # Request and per-stage latency histograms, in-flight counts and cache hit ratios on /metrics
+app.register_blueprint(chat_api)
 
 if __name__ == "__main__":
     app.run(debug=True, port=8000)
@@ -0,0 +1,236 @@
+import os
+import time
+import logging
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from telemetry import UPSTREAM_IN_FLIGHT, in_request_context, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+# Overpass fair use: keep concurrency and request rate per host modest
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 1.0  # seconds, doubled on every retry
+DEFAULT_TIMEOUT = 30
+
+# Responses worth retrying: rate limited, or the server is overloaded/timed out
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing requests to one host at least 1/rate seconds apart.
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Claim the next request slot; returns the seconds to wait until it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        return max(0.0, wait)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+_host_limiters: Dict[str, RateLimiter] = {}
+_host_limiters_lock = threading.Lock()
+
+
+def limiter_for(url: str, requests_per_second: float) -> RateLimiter:
+    """Return the process-wide rate limiter for the host of `url`."""
+    host = urlparse(url).netloc
+    with _host_limiters_lock:
+        if host not in _host_limiters:
+            _host_limiters[host] = RateLimiter(requests_per_second)
+        return _host_limiters[host]
+
+
+class OverpassClient:
+    """
+    Concurrent Overpass API client.
+
+    Queries run on a bounded thread pool over one keep-alive `requests.Session`,
+    spaced by a per-host rate limiter and retried with exponential backoff on
+    429/5xx responses and connection errors.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, max_workers: Optional[int] = None,
+                 requests_per_second: Optional[float] = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT):
+        self.base_url = base_url or os.getenv("OVERPASS_URL", DEFAULT_OVERPASS_URL)
+        self.max_workers = max_workers or int(os.getenv("OVERPASS_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+        if requests_per_second is None:
+            requests_per_second = float(os.getenv("OVERPASS_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = limiter_for(self.base_url, requests_per_second)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, query: str) -> Dict:
+        """
+        Run one Overpass query and return the decoded JSON.
+        Raises requests.exceptions.RequestException once retries are exhausted.
+        """
+        with span("overpass_request"):
+            return self._fetch_with_retries(query)
+
+    def _fetch_with_retries(self, query: str) -> Dict:
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                with UPSTREAM_IN_FLIGHT.track(upstream="overpass"):
+                    response = self.session.post(self.base_url, data=query, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    time.sleep(self._retry_delay(attempt, response.headers.get("Retry-After")))
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+
+    def fetch_all(self, queries: List[str]) -> List[Optional[Dict]]:
+        """
+        Run many queries concurrently. Results come back in the order of `queries`;
+        a query that failed after all retries yields None.
+        """
+        def fetch_or_none(query):
+            try:
+                return self.fetch(query)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning("Error fetching parking data: %s", e)
+                return None
+
+        if len(queries) <= 1:
+            return [fetch_or_none(query) for query in queries]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(queries))) as pool:
+            return list(pool.map(in_request_context(fetch_or_none), queries))
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        # Exponential backoff with jitter so parallel workers do not retry in lockstep
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+
+class AsyncOverpassClient:
+    """
+    OverpassClient for an asyncio event loop: requests are aiohttp calls awaiting the same
+    per-host rate limiter (threads and coroutines share one request budget per host),
+    retried with the same backoff, so waiting on Overpass never holds a thread.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, max_workers: Optional[int] = None,
+                 requests_per_second: Optional[float] = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT):
+        self.base_url = base_url or os.getenv("OVERPASS_URL", DEFAULT_OVERPASS_URL)
+        self.max_workers = max_workers or int(os.getenv("OVERPASS_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+        if requests_per_second is None:
+            requests_per_second = float(os.getenv("OVERPASS_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = limiter_for(self.base_url, requests_per_second)
+        self._session = None
+
+    _retry_delay = OverpassClient._retry_delay
+
+    def _get_session(self):
+        import aiohttp
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def fetch(self, query: str) -> Dict:
+        """
+        Run one Overpass query and return the decoded JSON.
+        Raises aiohttp.ClientError or asyncio.TimeoutError once retries are exhausted.
+        """
+        import aiohttp
+        session = self._get_session()
+        with span("overpass_request"):
+            for attempt in range(self.max_retries + 1):
+                await asyncio.sleep(self.limiter.reserve())
+                try:
+                    with UPSTREAM_IN_FLIGHT.track(upstream="overpass"):
+                        async with session.post(self.base_url, data=query) as response:
+                            if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                                delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+                            else:
+                                response.raise_for_status()
+                                return await response.json(content_type=None)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._retry_delay(attempt)
+                await asyncio.sleep(delay)
+
+    async def fetch_all(self, queries: List[str]) -> List[Optional[Dict]]:
+        """
+        Run many queries concurrently (at most max_workers at a time). Results come back
+        in the order of `queries`; a query that failed after all retries yields None.
+        """
+        import aiohttp
+        slots = asyncio.Semaphore(self.max_workers)
+
+        async def fetch_or_none(query):
+            async with slots:
+                try:
+                    return await self.fetch(query)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning("Error fetching parking data: %s", e)
+                    return None
+
+        return list(await asyncio.gather(*(fetch_or_none(query) for query in queries)))
+
+    def threadsafe(self, loop: asyncio.AbstractEventLoop) -> "LoopBoundOverpassClient":
+        """Blocking view of this client for code running on executor threads."""
+        return LoopBoundOverpassClient(self, loop)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+class LoopBoundOverpassClient:
+    """
+    The blocking `fetch_all` of OverpassClient, served by an AsyncOverpassClient on an
+    event loop: synchronous code (a parking scan on an executor thread) waits for the
+    result, while the requests themselves run non-blocking on the loop.
+    """
+
+    def __init__(self, client: AsyncOverpassClient, loop: asyncio.AbstractEventLoop):
+        self.client = client
+        self.loop = loop
+        self.base_url = client.base_url
+
+    def fetch_all(self, queries: List[str]) -> List[Optional[Dict]]:
+        return asyncio.run_coroutine_threadsafe(self.client.fetch_all(queries), self.loop).result()
@@ -0,0 +1,136 @@
+import math
+from dataclasses import dataclass, field
+from typing import List
+
+# Limits for one planned Overpass request
+MAX_REGION_AREA_KM2 = 16.0
+MAX_BOXES_PER_QUERY = 40
+MAX_ESTIMATED_ELEMENTS = 1500
+ESTIMATED_ELEMENTS_PER_KM2 = 150  # Dense city-centre parking, so estimates err on the high side
+
+# How much empty area merging two boxes into one may add, relative to the area they cover
+MAX_MERGE_WASTE = 0.1
+
+KM_PER_DEGREE = 111.32
+
+
+@dataclass
+class QueryRegion:
+    """A group of bounding boxes fetched together in one Overpass request."""
+    bboxes: List[List[float]] = field(default_factory=list)  # [min lon, min lat, max lon, max lat]
+    area_km2: float = 0.0
+
+    @property
+    def bounds(self) -> List[float]:
+        return union_bbox(self.bboxes)
+
+    @property
+    def center(self) -> List[float]:
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        return [(min_lon + max_lon) / 2, (min_lat + max_lat) / 2]
+
+
+def union_bbox(bboxes: List[List[float]]) -> List[float]:
+    return [
+        min(b[0] for b in bboxes),
+        min(b[1] for b in bboxes),
+        max(b[2] for b in bboxes),
+        max(b[3] for b in bboxes),
+    ]
+
+
+def bbox_area_km2(bbox: List[float]) -> float:
+    """Approximate area of a lon/lat bounding box in square kilometres."""
+    mid_lat = math.radians((bbox[1] + bbox[3]) / 2)
+    width = max(0.0, bbox[2] - bbox[0]) * KM_PER_DEGREE * math.cos(mid_lat)
+    height = max(0.0, bbox[3] - bbox[1]) * KM_PER_DEGREE
+    return width * height
+
+
+def overlap_area_km2(a: List[float], b: List[float]) -> float:
+    overlap = [max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])]
+    if overlap[0] >= overlap[2] or overlap[1] >= overlap[3]:
+        return 0.0
+    return bbox_area_km2(overlap)
+
+
+def coalesce_bboxes(bboxes: List[List[float]], max_area_km2: float = MAX_REGION_AREA_KM2,
+                    max_waste: float = MAX_MERGE_WASTE) -> List[List[float]]:
+    """
+    Merge consecutive, overlapping route boxes into larger boxes.
+
+    A box is absorbed into the current one while the merged box stays under the area cap
+    and adds at most `max_waste` of empty area on top of what the boxes actually cover.
+    Straight stretches collapse into a few long boxes; bends start a new box.
+    """
+    merged = []
+    current, covered = None, 0.0
+
+    for bbox in bboxes:
+        if current is None:
+            current, covered = list(bbox), bbox_area_km2(bbox)
+            continue
+
+        candidate = union_bbox([current, bbox])
+        candidate_area = bbox_area_km2(candidate)
+        new_covered = covered + bbox_area_km2(bbox) - overlap_area_km2(current, bbox)
+
+        if candidate_area <= max_area_km2 and candidate_area <= new_covered * (1 + max_waste):
+            current, covered = candidate, new_covered
+        else:
+            merged.append(current)
+            current, covered = list(bbox), bbox_area_km2(bbox)
+
+    if current is not None:
+        merged.append(current)
+    return merged
+
+
+def plan_route_queries(bboxes: List[List[float]], max_area_km2: float = MAX_REGION_AREA_KM2,
+                       max_boxes: int = MAX_BOXES_PER_QUERY,
+                       max_elements: int = MAX_ESTIMATED_ELEMENTS) -> List[QueryRegion]:
+    """
+    Plan the Overpass requests for a route scan.
+
+    Overlapping sample boxes are coalesced first, then consecutive boxes are grouped into
+    regions, each fetched with one union query. A region is closed once its total area,
+    box count or estimated element count would exceed the caps. Regions keep route order.
+    """
+    regions = []
+    current = QueryRegion()
+
+    for bbox in coalesce_bboxes(bboxes, max_area_km2):
+        area = bbox_area_km2(bbox)
+        total_area = current.area_km2 + area
+        if current.bboxes and (
+            total_area > max_area_km2
+            or len(current.bboxes) >= max_boxes
+            or total_area * ESTIMATED_ELEMENTS_PER_KM2 > max_elements
+        ):
+            regions.append(current)
+            current = QueryRegion()
+        current.bboxes.append(bbox)
+        current.area_km2 += area
+
+    if current.bboxes:
+        regions.append(current)
+    return regions
+
+
+def build_union_query(bboxes: List[List[float]], filters: List[str], timeout: int = 25) -> str:
+    """
+    Build one Overpass query returning the ways matching any filter inside any of the boxes.
+    Ways found in several boxes are returned once, with their centre and tags only.
+    """
+    statements = "\n".join(
+        f"            way({b[1]},{b[0]},{b[3]},{b[2]}){tag_filter};"
+        for b in bboxes
+        for tag_filter in filters
+    )
+    return f"""
+        [out:json][timeout:{timeout}];
+        (
+{statements}
+        );
+        out center tags;
+        """
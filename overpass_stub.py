@@ -0,0 +1,162 @@
+"""
+Local stand-in for the Overpass API, for testing and benchmarking parking scans offline.
+
+Serves synthetic parking ways on a fixed lat/lon grid, so overlapping queries return
+the same way ids just like the real service. Latency and rate-limit responses can be
+injected to exercise the client's concurrency and retry handling.
+
+    python overpass_stub.py --port 8099 --latency 0.2
+    OVERPASS_URL=http://127.0.0.1:8099/api/interpreter python app.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# One synthetic parking way every GRID_STEP degrees (~100 m)
+GRID_STEP = 0.001
+
+BBOX_PATTERN = re.compile(r"\((-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)\)")
+POLY_PATTERN = re.compile(r'poly:"([^"]+)"')
+
+PARKING_TYPES = ["surface", "street_side", "multi-storey", "parallel", "lane"]
+
+
+def parse_regions(query):
+    """
+    Extract the search regions of an Overpass query as ("bbox", s, w, n, e) or ("poly", points) tuples.
+    """
+    regions = []
+    for match in POLY_PATTERN.finditer(query):
+        values = [float(v) for v in match.group(1).split()]
+        regions.append(("poly", list(zip(values[0::2], values[1::2]))))
+    for match in BBOX_PATTERN.finditer(query):
+        regions.append(("bbox",) + tuple(float(v) for v in match.groups()))
+    return regions
+
+
+def point_in_polygon(lat, lon, points):
+    inside = False
+    j = len(points) - 1
+    for i in range(len(points)):
+        lat_i, lon_i = points[i]
+        lat_j, lon_j = points[j]
+        if (lon_i > lon) != (lon_j > lon) and lat < (lat_j - lat_i) * (lon - lon_i) / (lon_j - lon_i) + lat_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+def synthetic_way(row, col):
+    """Deterministic parking way for one grid cell."""
+    rng = random.Random(row * 1000003 + col)
+    lat = (row + 0.5) * GRID_STEP
+    lon = (col + 0.5) * GRID_STEP
+    return {
+        "type": "way",
+        "id": abs(row * 1000003 + col),
+        "center": {"lat": round(lat, 7), "lon": round(lon, 7)},
+        "tags": {
+            "amenity": "parking",
+            "parking": rng.choice(PARKING_TYPES),
+            "access": rng.choice(["public", "customers", "private"]),
+            "fee": rng.choice(["yes", "no"]),
+            "capacity": str(rng.randint(2, 200)),
+            "surface": rng.choice(["asphalt", "paving_stones", "gravel"]),
+            "maxstay": rng.choice(["", "2 hours", "4 hours"]),
+        },
+    }
+
+
+def elements_for(regions):
+    elements = {}
+    for region in regions:
+        if region[0] == "bbox":
+            s, w, n, e = region[1:]
+            in_region = None
+        else:
+            lats = [p[0] for p in region[1]]
+            lons = [p[1] for p in region[1]]
+            s, w, n, e = min(lats), min(lons), max(lats), max(lons)
+            in_region = region[1]
+
+        for row in range(int(s // GRID_STEP), int(n // GRID_STEP) + 1):
+            for col in range(int(w // GRID_STEP), int(e // GRID_STEP) + 1):
+                way = synthetic_way(row, col)
+                lat, lon = way["center"]["lat"], way["center"]["lon"]
+                if not (s <= lat <= n and w <= lon <= e):
+                    continue
+                if in_region and not point_in_polygon(lat, lon, in_region):
+                    continue
+                elements[way["id"]] = way
+    return list(elements.values())
+
+
+class OverpassStubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    rate_limit_probability = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        # requests sends a raw body; browsers may send data=<query>
+        query = parse_qs(body).get("data", [body])[0]
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if random.random() < self.rate_limit_probability:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+
+        payload = json.dumps({"version": 0.6, "generator": "overpass-stub", "elements": elements_for(parse_regions(query))}).encode("utf-8")
+        with self.server.counter_lock:
+            self.server.requests_served += 1
+            self.server.bytes_served += len(payload)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+
+def start_stub_server(port=0, latency=0.0, rate_limit_probability=0.0):
+    """
+    Start the stub on a background thread. Returns (server, base_url); call server.shutdown() to stop.
+    `server.requests_served` and `server.bytes_served` count successful responses.
+    """
+    handler = type("Handler", (OverpassStubHandler,), {
+        "latency": latency,
+        "rate_limit_probability": rate_limit_probability,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.counter_lock = threading.Lock()
+    server.requests_served = 0
+    server.bytes_served = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/interpreter"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub Overpass API server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="probability of answering 429")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.latency, args.rate_limit)
+    print(f"Stub Overpass API listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,271 @@
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Sequence, Union
+import numpy as np
+
+# Tag columns stored as codes into the table's string pool
+STRING_COLUMNS = ("type", "access", "fee", "maxstay", "surface", "lane_left", "lane_right", "lane_both")
+# Numeric columns; -1 marks a missing or non-numeric tag
+COUNT_COLUMNS = ("capacity", "disabled")
+# The tag text of each numeric column (e.g. "5-10"), as string pool codes; records return it as given
+COUNT_TEXT_COLUMNS = tuple(name + "_text" for name in COUNT_COLUMNS)
+
+PAID_FEE_VALUES = {"yes", "paid", "ticket", "pay_and_display"}
+FREE_FEE_VALUES = {"no", "free"}
+
+
+@dataclass(slots=True)
+class ParkingSpot:
+    id: str
+    location: List[float]
+    type: str
+    capacity: int = 0
+    fee: bool = False
+    maxstay: str = ""
+    disabled_spaces: int = 0
+    surface: str = ""
+    access: str = "public"
+    lanes: Dict[str, str] = field(default_factory=dict)
+
+
+class StringPool:
+    """Interns tag values: each distinct string is stored once and referenced by code. Code 0 is ''."""
+    __slots__ = ("values", "_codes")
+
+    def __init__(self):
+        self.values = [""]
+        self._codes = {"": 0}
+
+    def code(self, value) -> int:
+        value = "" if value is None else str(value)
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value) -> int:
+        """Code of a value, or -1 when it never occurs (no new entry is made)."""
+        return self._codes.get(value, -1)
+
+
+def _count(value) -> int:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return -1
+
+
+def _fee_flag(value: str) -> int:
+    value = value.lower()
+    if value in PAID_FEE_VALUES:
+        return 1
+    if value in FREE_FEE_VALUES:
+        return 0
+    return -1
+
+
+class ParkingTable:
+    """
+    Column store of parking spots along a route.
+
+    Every field lives in a typed array (struct of arrays): coordinates as doubles, capacity
+    and disabled spaces as integers, fee as a paid/free/unknown flag, and tag strings as
+    codes into a shared `StringPool`, so repeated values such as "asphalt" or "public" are
+    stored once. Spots are only turned back into dicts or GeoJSON when they are serialized.
+    """
+    __slots__ = ("strings", "ids", "element_type", "lon", "lat", "paid") + STRING_COLUMNS + COUNT_COLUMNS + COUNT_TEXT_COLUMNS
+
+    def __init__(self, strings: StringPool = None):
+        self.strings = strings or StringPool()
+        self.ids = array("q")
+        self.element_type = array("I")
+        self.lon = array("d")
+        self.lat = array("d")
+        self.paid = array("b")
+        for name in STRING_COLUMNS:
+            setattr(self, name, array("I"))
+        for name in COUNT_COLUMNS:
+            setattr(self, name, array("i"))
+        for name in COUNT_TEXT_COLUMNS:
+            setattr(self, name, array("I"))
+
+    @classmethod
+    def from_dicts(cls, spots: Iterable[Dict[str, Any]]) -> "ParkingTable":
+        """Build a table from processed spot dicts (see ParkingDataProcessor._process_parking_element)."""
+        table = cls()
+        for spot in spots:
+            table.append(spot)
+        return table
+
+    def append(self, spot: Dict[str, Any]):
+        code = self.strings.code
+        parking = spot.get("parking") or {}
+        lanes = parking.get("lanes") or {}
+
+        self.ids.append(int(spot["id"]))
+        self.element_type.append(code(spot.get("type")))
+        self.lon.append(float(spot["location"][0]))
+        self.lat.append(float(spot["location"][1]))
+        for name in ("type", "access", "fee", "maxstay", "surface"):
+            getattr(self, name).append(code(parking.get(name)))
+        for side in ("left", "right", "both"):
+            getattr(self, "lane_" + side).append(code(lanes.get(side)))
+        self.paid.append(_fee_flag(self.strings.values[self.fee[-1]]))
+        for name in COUNT_COLUMNS:
+            getattr(self, name).append(_count(parking.get(name)))
+            getattr(self, name + "_text").append(code(parking.get(name)))
+
+    def _copy_row(self, source: "ParkingTable", row: int):
+        # Both tables share one string pool, so codes are copied as they are
+        self.ids.append(source.ids[row])
+        for name in ("element_type", "lon", "lat", "paid") + STRING_COLUMNS + COUNT_COLUMNS + COUNT_TEXT_COLUMNS:
+            getattr(self, name).append(getattr(source, name)[row])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def locations(self) -> np.ndarray:
+        """Spot coordinates as an (n, 2) array of [lon, lat], without copying per spot."""
+        return np.column_stack([np.frombuffer(self.lon, dtype=np.float64), np.frombuffer(self.lat, dtype=np.float64)])
+
+    def take(self, rows: Sequence[int]) -> "ParkingTable":
+        table = ParkingTable(self.strings)
+        for row in rows:
+            table._copy_row(self, row)
+        return table
+
+    def merged(self, clusters: Iterable[Sequence[int]]) -> "ParkingTable":
+        """
+        One spot per cluster of row indices. The first spot of a cluster is kept and any
+        field it lacks is filled from the next spot in the cluster that has it. A count is
+        filled together with its tag text, so both always describe the same spot.
+        """
+        table = ParkingTable(self.strings)
+        for cluster in clusters:
+            table._copy_row(self, cluster[0])
+            for row in cluster[1:]:
+                for name in STRING_COLUMNS:
+                    column = getattr(table, name)
+                    if not column[-1]:
+                        column[-1] = getattr(self, name)[row]
+                for name in COUNT_COLUMNS:
+                    column, text = getattr(table, name), getattr(table, name + "_text")
+                    if column[-1] >= 0:
+                        continue
+                    # A numeric count beats unparsed text ("5-10"), which beats no tag at all
+                    if getattr(self, name)[row] >= 0 or not text[-1]:
+                        column[-1] = getattr(self, name)[row]
+                        text[-1] = getattr(self, name + "_text")[row]
+            table.paid[-1] = _fee_flag(self.strings.values[table.fee[-1]])
+        return table
+
+    def type_counts(self) -> Dict[str, int]:
+        """Number of spots per parking type, in one pass over the type codes."""
+        values = self.strings.values
+        return {values[code]: count for code, count in Counter(self.type).items()}
+
+    def spot(self, row: int) -> ParkingSpot:
+        s = self.strings.values
+        return ParkingSpot(
+            id=str(self.ids[row]),
+            location=[self.lon[row], self.lat[row]],
+            type=s[self.type[row]],
+            capacity=max(self.capacity[row], 0),
+            fee=self.paid[row] == 1,
+            maxstay=s[self.maxstay[row]],
+            disabled_spaces=max(self.disabled[row], 0),
+            surface=s[self.surface[row]],
+            access=s[self.access[row]],
+            lanes={side: s[getattr(self, "lane_" + side)[row]] for side in ("left", "right", "both")},
+        )
+
+    def __iter__(self):
+        return (self.spot(row) for row in range(len(self)))
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Spots in the nested dict layout the API has always returned."""
+        s = self.strings.values
+        records = []
+        for row in range(len(self)):
+            records.append({
+                'id': str(self.ids[row]),
+                'location': [self.lon[row], self.lat[row]],
+                'type': s[self.element_type[row]],
+                'parking': {
+                    'type': s[self.type[row]],
+                    'access': s[self.access[row]],
+                    'fee': s[self.fee[row]],
+                    'maxstay': s[self.maxstay[row]],
+                    'capacity': s[self.capacity_text[row]],
+                    'disabled': s[self.disabled_text[row]],
+                    'surface': s[self.surface[row]],
+                    'lanes': {
+                        'left': s[self.lane_left[row]],
+                        'right': s[self.lane_right[row]],
+                        'both': s[self.lane_both[row]],
+                    }
+                }
+            })
+        return records
+
+    def to_geojson(self) -> Dict[str, Any]:
+        """Spots as a GeoJSON FeatureCollection of points."""
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "id": record["id"],
+                    "geometry": {"type": "Point", "coordinates": record["location"]},
+                    "properties": dict(record["parking"], element_type=record["type"]),
+                }
+                for record in self.to_records()
+            ],
+        }
+
+    def to_columns(self) -> Dict[str, Any]:
+        """
+        Compact column layout: one list per field, tag columns as indices into `strings`
+        and -1 for unknown counts (their tag text, e.g. "5-10", is in the `_text` columns).
+        Much smaller to encode and send than per-spot dicts.
+        """
+        columns = {
+            "count": len(self),
+            "strings": self.strings.values,
+            "id": [str(i) for i in self.ids],
+            "lon": self.lon.tolist(),
+            "lat": self.lat.tolist(),
+            "element_type": self.element_type.tolist(),
+            "paid": self.paid.tolist(),
+        }
+        for name in STRING_COLUMNS + COUNT_COLUMNS + COUNT_TEXT_COLUMNS:
+            columns[name] = getattr(self, name).tolist()
+        return columns
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns and the string pool."""
+        columns = sum(
+            getattr(self, name).itemsize * len(getattr(self, name))
+            for name in ("ids", "element_type", "lon", "lat", "paid") + STRING_COLUMNS + COUNT_COLUMNS + COUNT_TEXT_COLUMNS
+        )
+        return columns + sum(len(value) + 49 for value in self.strings.values)
+
+
+def as_parking_table(parking_data: Union[ParkingTable, Iterable[Dict[str, Any]]]) -> ParkingTable:
+    """Accept either a ParkingTable or a list of processed spot dicts."""
+    if isinstance(parking_data, ParkingTable):
+        return parking_data
+    return ParkingTable.from_dicts(parking_data)
+
+
+def serialize_parking(table: ParkingTable, fmt: str = "columns") -> Any:
+    """Serialize a table for the API: "columns" (compact), "records" (nested dicts) or "geojson"."""
+    if fmt == "records":
+        return table.to_records()
+    if fmt == "geojson":
+        return table.to_geojson()
+    if fmt == "columns":
+        return table.to_columns()
+    raise ValueError(f"Unknown parking format: {fmt}")
@@ -0,0 +1,24 @@
+"""
+Page text extraction for pdf_pages.extract_pages, run as its own process:
+
+    echo '{"pdf_path": "rules.pdf", "pages": [0, 1, 2]}' | python pdf_extract_worker.py
+
+Writes [[page index, text], ...] as JSON to stdout. It imports nothing but PyPDF2, so a
+worker costs one interpreter start; a multiprocessing worker would import the server's
+main module again (Gemini client, embedding model, caches) before extracting anything.
+"""
+import sys
+import json
+from typing import List, Tuple
+from PyPDF2 import PdfReader
+
+
+def extract_page_range(pdf_path: str, page_indices: List[int]) -> List[Tuple[int, str]]:
+    """Extract the text of some pages (0-based indices) of one PDF."""
+    reader = PdfReader(pdf_path)
+    return [(i, reader.pages[i].extract_text() or "") for i in page_indices]
+
+
+if __name__ == "__main__":
+    request = json.load(sys.stdin)
+    json.dump(extract_page_range(request["pdf_path"], request["pages"]), sys.stdout)
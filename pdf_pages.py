@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import PyPDF2
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pdf_extract_worker import extract_page_range
+from rules_index import CHUNK_SIZE, CHUNK_OVERLAP, DEFAULT_INDEX_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Sub-directory of the index cache holding extracted page text, one file per page hash
+PAGE_CACHE_SUBDIR = "pages"
+
+# Below this many pages to extract, worker processes cost more than they save
+MIN_PAGES_FOR_POOL = 8
+
+# Script run by each extraction worker process (imports only PyPDF2)
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_extract_worker.py")
+
+Page = Tuple[int, str]  # (1-based page number, extracted text)
+
+
+def page_hashes(pdf_path: str) -> List[str]:
+    """
+    Hash every page of a PDF by its content stream and its resources (fonts and their
+    encodings decide what text the stream's glyphs map to), including resources the page
+    inherits from the page tree. Reading these is cheap next
+    to text extraction, so unchanged pages are found without extracting anything. The
+    PyPDF2 version is part of the hash, so upgrading the extractor re-extracts every page.
+    """
+    hashes = []
+    resolved = {}  # Digests of shared objects (fonts, usually), computed once per document
+    for page in PdfReader(pdf_path).pages:
+        contents = page.get_contents()
+        digest = hashlib.sha256(PyPDF2.__version__.encode("utf-8"))
+        digest.update(contents.get_data() if contents is not None else b"")
+        digest.update(_object_digest(_page_resources(page), resolved))
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def _page_resources(page):
+    """
+    The page's /Resources, or those of the nearest page tree node above it that has them
+    (resources are inheritable, so a page may have none of its own).
+    """
+    node, seen = page, set()
+    while node is not None and id(node) not in seen:
+        seen.add(id(node))
+        if "/Resources" in node:
+            return node.raw_get("/Resources")
+        parent = node.get("/Parent")
+        node = parent.get_object() if parent is not None else None
+    return None
+
+
+def _object_digest(obj, resolved: Dict) -> bytes:
+    """
+    Digest of a PDF object and everything it references, following indirect references
+    (each hashed once, cycles cut) and hashing streams by their raw, still-encoded bytes.
+    """
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key not in resolved:
+            resolved[key] = b"cycle"  # Placeholder while this object is being hashed
+            resolved[key] = _object_digest(obj.get_object(), resolved)
+        return resolved[key]
+
+    digest = hashlib.sha256(type(obj).__name__.encode("utf-8"))
+    if isinstance(obj, DictionaryObject):
+        for key in sorted(obj):
+            digest.update(str(key).encode("utf-8"))
+            digest.update(_object_digest(obj.raw_get(key), resolved))
+        if isinstance(obj, StreamObject):
+            data = getattr(obj, "_data", None)  # Raw bytes: no need to decode just to hash
+            digest.update(data if isinstance(data, bytes) else obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            digest.update(_object_digest(item, resolved))
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+    return digest.digest()
+
+
+def _extract_in_worker(pdf_path: str, page_indices: List[int]) -> List[Tuple[int, str]]:
+    """extract_page_range in a pdf_extract_worker process."""
+    request = json.dumps({"pdf_path": os.path.abspath(pdf_path), "pages": page_indices})
+    result = subprocess.run([sys.executable, WORKER_SCRIPT], input=request, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Extracting pages of {os.path.basename(pdf_path)} failed: {result.stderr.strip()[-500:]}")
+    return [(i, text) for i, text in json.loads(result.stdout)]
+
+
+class PageTextCache:
+    """
+    Extracted page text on disk, keyed by page hash.
+    Each entry is written to a temporary file and renamed into place, so concurrent
+    builds never read a half-written page.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _path(self, page_hash: str) -> str:
+        return os.path.join(self.cache_dir, page_hash + ".txt")
+
+    def get(self, page_hash: str) -> Optional[str]:
+        try:
+            with open(self._path(page_hash), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, page_hash: str, text: str):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.cache_dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self._path(page_hash))
+        except OSError as e:
+            # A read-only cache only costs re-extraction on the next start
+            logger.warning("Could not cache extracted page %s: %s", page_hash[:12], e)
+
+
+def create_page_cache(cache_dir: str = None) -> PageTextCache:
+    """Page text cache inside the index cache directory (INDEX_CACHE_DIR)."""
+    cache_dir = cache_dir or os.getenv("INDEX_CACHE_DIR", DEFAULT_INDEX_CACHE_DIR)
+    return PageTextCache(os.path.join(cache_dir, PAGE_CACHE_SUBDIR))
+
+
+def extract_pages(pdf_path: str, cache: PageTextCache = None, max_workers: int = None,
+                  progress=None) -> List[Page]:
+    """
+    Extract the text of every page of a PDF, reusing cached text for unchanged pages.
+
+    Pages missing from the cache are split into one contiguous range per worker and
+    extracted in pdf_extract_worker processes (PDF_EXTRACT_WORKERS, default: all cores),
+    so a large document scales with the available cores.
+
+    Returns:
+        (page number, text) pairs in page order, page numbers starting at 1
+    """
+    cache = cache or create_page_cache()
+    max_workers = max_workers or int(os.getenv("PDF_EXTRACT_WORKERS", 0)) or os.cpu_count() or 1
+    hashes = page_hashes(pdf_path)
+
+    texts: Dict[int, str] = {}
+    missing = []
+    for i, page_hash in enumerate(hashes):
+        text = cache.get(page_hash)
+        if text is None:
+            missing.append(i)
+        else:
+            texts[i] = text
+
+    if progress:
+        progress("extracting", len(texts), len(hashes))
+
+    if missing:
+        workers = min(max_workers, len(missing))
+        if workers <= 1 or len(missing) < MIN_PAGES_FOR_POOL:
+            extracted = extract_page_range(pdf_path, missing)
+        else:
+            size = -(-len(missing) // workers)
+            ranges = [missing[start:start + size] for start in range(0, len(missing), size)]
+            extracted = []
+            # Fresh interpreters, not forks of this multi-threaded process; each thread waits on one
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                for pages in pool.map(_extract_in_worker, [pdf_path] * len(ranges), ranges):
+                    extracted.extend(pages)
+                    if progress:
+                        progress("extracting", len(texts) + len(extracted), len(hashes))
+
+        for i, text in extracted:
+            texts[i] = text
+            cache.put(hashes[i], text)
+
+    logger.info("Extracted %d pages of %s: %d from cache, %d parsed",
+                len(hashes), os.path.basename(pdf_path), len(hashes) - len(missing), len(missing))
+    return [(i + 1, texts[i]) for i in range(len(hashes))]
+
+
+def create_page_chunks(pages: List[Page], metadata: Dict = None) -> List[Dict]:
+    """
+    Split every page into chunks of at most CHUNK_SIZE characters.
+    Chunks never span pages, so each carries the page it came from and editing a page
+    only changes that page's chunks. `start` is the chunk's character offset in the page
+    text, so overlapping or adjacent retrieved chunks can be stitched back together.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, add_start_index=True)
+    chunks = []
+    for page_number, text in pages:
+        for document in text_splitter.create_documents([text]):
+            chunks.append({
+                "text": document.page_content,
+                "metadata": dict(metadata or {}, page=page_number, start=document.metadata["start_index"]),
+            })
+    return chunks
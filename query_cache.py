@@ -0,0 +1,200 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import faiss
+import numpy as np
+from telemetry import UPSTREAM_IN_FLIGHT, span
+
+# Default bounds for the query caches (overridable through QUERY_CACHE_SIZE / QUERY_CACHE_TTL)
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 3600  # seconds
+
+# A filtered search first fetches this many times k candidates, widening until k pass the filter
+FILTER_FETCH_FACTOR = 4
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TRAILING_PUNCTUATION = " ?!.,;:"
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed time-to-live.
+    Keeps hit/miss counters so cache effectiveness can be monitored.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def normalize_query(query):
+    """
+    Canonical form of a question, so trivially different phrasings share cache entries.
+    """
+    return WHITESPACE_PATTERN.sub(" ", query).strip(TRAILING_PUNCTUATION).lower()
+
+
+def embedding_key(embedding):
+    """
+    Compact hashable key for an embedding vector.
+    """
+    return hashlib.sha1(np.asarray(embedding, dtype=np.float32).tobytes()).hexdigest()
+
+
+class RetrievalCache:
+    """
+    Two-level cache in front of the rules index:
+
+    1. normalized query -> query embedding (skips the embedding call)
+    2. (embedding, k, index version) -> retrieved chunk ids (skips the FAISS search)
+
+    Both levels are dropped whenever the index version changes.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.embeddings = TTLCache(maxsize, ttl)
+        self.results = TTLCache(maxsize, ttl)
+        self._index_version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, index_version):
+        with self._lock:
+            if index_version != self._index_version:
+                self.embeddings.clear()
+                self.results.clear()
+                self._index_version = index_version
+
+    def embed_query(self, query, embedding_model):
+        """
+        Embedding of the normalized query, computed at most once per cache lifetime.
+        """
+        normalized = normalize_query(query)
+        embedding = self.embeddings.get(normalized)
+        if embedding is None:
+            with span("query_embedding"), UPSTREAM_IN_FLIGHT.track(upstream="embedder"):
+                embedding = embedding_model.embed_query(normalized)
+            self.embeddings.put(normalized, embedding)
+        return embedding
+
+    def embed_queries(self, queries, embedding_model):
+        """
+        Embeddings of several queries; the ones not cached are embedded in one batched call.
+        """
+        normalized = [normalize_query(query) for query in queries]
+        embeddings = [self.embeddings.get(text) for text in normalized]
+        missing = list(dict.fromkeys(text for text, embedding in zip(normalized, embeddings) if embedding is None))
+
+        if missing:
+            embed = getattr(embedding_model, "embed_queries", None)
+            with span("query_embedding"), UPSTREAM_IN_FLIGHT.track(upstream="embedder"):
+                vectors = embed(missing) if embed else [embedding_model.embed_query(text) for text in missing]
+            computed = dict(zip(missing, vectors))
+            for text, vector in computed.items():
+                self.embeddings.put(text, vector)
+            embeddings = [embedding if embedding is not None else computed[text]
+                          for text, embedding in zip(normalized, embeddings)]
+        return embeddings
+
+    def retrieve_many(self, vectorstore, index_version, queries, k, embedding_model, sources=None):
+        """
+        `retrieve` for several queries at once: one batched embedding call and one FAISS
+        search over all queries whose results are not cached. Returns one Document list per query.
+        """
+        self._check_version(index_version)
+        embeddings = self.embed_queries(queries, embedding_model)
+        sources = tuple(sorted(set(sources))) if sources else None
+
+        keys = [(embedding_key(embedding), k, index_version, sources) for embedding in embeddings]
+        results = [self.results.get(key) for key in keys]
+        missing = [i for i, chunk_ids in enumerate(results) if chunk_ids is None]
+
+        if missing:
+            keep = None
+            if sources:
+                keep = lambda cid: vectorstore.docstore.search(cid).metadata.get("source") in sources
+            for i, chunk_ids in zip(missing, search_chunk_ids(vectorstore, [embeddings[i] for i in missing], k, keep)):
+                self.results.put(keys[i], chunk_ids)
+                results[i] = chunk_ids
+
+        return [[vectorstore.docstore.search(chunk_id) for chunk_id in chunk_ids] for chunk_ids in results]
+
+    def retrieve(self, vectorstore, index_version, query, k, embedding_model, sources=None):
+        """
+        Return the top-k rules chunks (as Documents) for a query, using the caches where possible.
+        When `sources` is given, only chunks from those documents are considered.
+        """
+        return self.retrieve_many(vectorstore, index_version, [query], k, embedding_model, sources)[0]
+
+    def stats(self):
+        return {
+            "index_version": self._index_version,
+            "query_embeddings": self.embeddings.stats(),
+            "retrieval_results": self.results.stats(),
+        }
+
+
+def search_chunk_ids(vectorstore, embeddings, k, keep=None):
+    """
+    Search the FAISS index for several query embeddings at once.
+    Returns one list of docstore ids per query, best match first.
+    `keep` optionally filters docstore ids; the search widens until k ids pass or the index is exhausted.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        faiss.normalize_L2(vectors)
+
+    total = vectorstore.index.ntotal
+    fetch_k = k if keep is None else max(k, min(total, k * FILTER_FETCH_FACTOR))
+    while True:
+        with span("faiss_search"):
+            _, indices = vectorstore.index.search(vectors, fetch_k)
+        results = [
+            [cid for cid in (vectorstore.index_to_docstore_id[i] for i in row if i != -1) if keep is None or keep(cid)][:k]
+            for row in indices
+        ]
+        if keep is None or fetch_k >= total or all(len(ids) >= k for ids in results):
+            return results
+        fetch_k = min(total, fetch_k * FILTER_FETCH_FACTOR)
@@ -0,0 +1,175 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# Defaults for the LLM response cache (overridable through RESPONSE_CACHE_* variables)
+DEFAULT_RESPONSE_CACHE_PATH = ".response_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+# Seconds a hit leaves last_used alone: eviction only needs a coarse recency, not a write per hit
+DEFAULT_TOUCH_INTERVAL = 60
+
+
+def prompt_key(model_name, prompt):
+    """
+    Exact-match key: hash of the LLM model and the final prompt sent to it.
+    """
+    return hashlib.sha256(f"{model_name}\x1f{prompt}".encode("utf-8")).hexdigest()
+
+
+def response_scope(*parts):
+    """
+    Scope for semantic matches: a cached answer may only be reused for a similar
+    question asked against the same road data, rules and models.
+    """
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier, persistent cache of LLM responses.
+
+    - Exact tier: the final prompt hash. The prompt already contains the retrieved
+      rules, the road data and the question, so a hit is always safe to reuse.
+    - Semantic tier: within one scope (road data + rules), a question whose embedding
+      is within the cosine threshold of a cached one reuses its answer.
+
+    Entries live in SQLite so they survive restarts and can be shared by several
+    workers. The least recently used entries are evicted beyond `max_entries`; a hit
+    only rewrites an entry's last_used once it is `touch_interval` seconds old.
+    """
+
+    def __init__(self, model_name, path=DEFAULT_RESPONSE_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD, touch_interval=DEFAULT_TOUCH_INTERVAL):
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " scope TEXT NOT NULL,"
+            " embedding BLOB,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+    def get(self, prompt, scope, embedding=None):
+        """
+        Look up a cached response.
+
+        Returns:
+            (response, tier) where tier is "exact" or "semantic", or (None, None) on a miss
+        """
+        key = prompt_key(self.model_name, prompt)
+        with self._lock:
+            row = self._conn.execute("SELECT response, last_used FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._touch(key, row[1])
+                self.hits["exact"] += 1
+                return row[0], "exact"
+
+            if embedding is not None:
+                match = self._nearest(scope, embedding)
+                if match is not None:
+                    key, response, last_used = match
+                    self._touch(key, last_used)
+                    self.hits["semantic"] += 1
+                    return response, "semantic"
+
+            self.misses += 1
+            return None, None
+
+    def put(self, prompt, scope, embedding, response):
+        vector = _unit_vector(embedding).tobytes() if embedding is not None else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, scope, embedding, response, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (prompt_key(self.model_name, prompt), scope, vector, response, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _nearest(self, scope, embedding):
+        rows = self._conn.execute(
+            "SELECT key, embedding, response, last_used FROM responses WHERE scope = ? AND embedding IS NOT NULL", (scope,)
+        ).fetchall()
+        if not rows:
+            return None
+
+        query = _unit_vector(embedding)
+        candidates = [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+        # Vectors from another embedding model (different size) can never match
+        comparable = [i for i, vector in enumerate(candidates) if vector.shape == query.shape]
+        if not comparable:
+            return None
+
+        similarities = np.stack([candidates[i] for i in comparable]) @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        row = rows[comparable[best]]
+        return row[0], row[2], row[3]
+
+    def _touch(self, key, last_used):
+        now = time.time()
+        if now - last_used < self.touch_interval:
+            return  # Recent enough for eviction; skip the write and commit on this hit
+        self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN"
+                " (SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def stats(self):
+        lookups = self.hits["exact"] + self.hits["semantic"] + self.misses
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _unit_vector(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def create_response_cache(model_name):
+    """
+    Build the response cache for an LLM model from RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_SIMILARITY and RESPONSE_CACHE_TOUCH_INTERVAL.
+    """
+    return ResponseCache(
+        model_name,
+        path=os.getenv("RESPONSE_CACHE_PATH", DEFAULT_RESPONSE_CACHE_PATH),
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", DEFAULT_SIMILARITY_THRESHOLD)),
+        touch_interval=float(os.getenv("RESPONSE_CACHE_TOUCH_INTERVAL", DEFAULT_TOUCH_INTERVAL)),
+    )
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from query_cache import TTLCache
+
+# Defaults for the road-data store (overridable through ROAD_DATA_* variables)
+DEFAULT_MAX_ROUTES = 10000
+DEFAULT_ROUTE_TTL = 6 * 3600  # seconds
+
+
+class RoadDataStore:
+    """
+    Route-keyed store for the road data posted by the frontend, together with the
+    prompt generated from it.
+
+    Entries are held in an in-process LRU/TTL cache. When `shared_path` is set they are
+    also written to a SQLite file, so any worker process can answer a query for a
+    route saved by another one.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAX_ROUTES, ttl=DEFAULT_ROUTE_TTL, shared_path=None):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize, ttl)
+        self._conn = None
+        self._lock = threading.Lock()
+
+        if shared_path:
+            self._conn = sqlite3.connect(shared_path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS routes ("
+                " route_id TEXT PRIMARY KEY,"
+                " road_data TEXT NOT NULL,"
+                " prompt TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def save(self, road_data, prompt):
+        """
+        Store road data and its precomputed prompt. Returns the new route id.
+        """
+        route_id = uuid.uuid4().hex
+        entry = {"road_data": road_data, "prompt": prompt}
+        self._memory.put(route_id, entry)
+
+        if self._conn is not None:
+            now = time.time()
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO routes (route_id, road_data, prompt, expires_at) VALUES (?, ?, ?, ?)",
+                    (route_id, json.dumps(road_data), prompt, now + self.ttl),
+                )
+                self._conn.execute("DELETE FROM routes WHERE expires_at < ?", (now,))
+                self._conn.commit()
+
+        return route_id
+
+    def get(self, route_id):
+        """
+        Look up a route. Returns {"road_data": ..., "prompt": ...} or None if unknown or expired.
+        """
+        entry = self._memory.get(route_id)
+        if entry is not None or self._conn is None:
+            return entry
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT road_data, prompt FROM routes WHERE route_id = ? AND expires_at >= ?",
+                (route_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+
+        entry = {"road_data": json.loads(row[0]), "prompt": row[1]}
+        self._memory.put(route_id, entry)
+        return entry
+
+    def stats(self):
+        return self._memory.stats()
+
+
+def create_road_data_store():
+    """
+    Build the road-data store from ROAD_DATA_MAX_ROUTES, ROAD_DATA_TTL and
+    ROAD_DATA_STORE_PATH (set the latter to share routes between worker processes).
+    """
+    return RoadDataStore(
+        maxsize=int(os.getenv("ROAD_DATA_MAX_ROUTES", DEFAULT_MAX_ROUTES)),
+        ttl=float(os.getenv("ROAD_DATA_TTL", DEFAULT_ROUTE_TTL)),
+        shared_path=os.getenv("ROAD_DATA_STORE_PATH") or None,
+    )
@@ -0,0 +1,87 @@
+from bisect import bisect_left
+import numpy as np
+from typing import List
+
+EARTH_RADIUS_M = 6371008.8
+
+# Route sampling parameters (metres). Urban stretches are sampled every ~200 m,
+# rural ones three times more sparsely.
+MIN_SAMPLE_SPACING_M = 200.0
+RURAL_SPACING_FACTOR = 3.0
+URBAN_SEGMENT_LENGTH_M = 100.0  # mean point spacing below which a stretch counts as urban
+URBAN_WINDOW = 5
+
+
+def as_lonlat_array(coordinates) -> np.ndarray:
+    """Route coordinates ([lon, lat] pairs) as an (n, 2) float64 array."""
+    return np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+
+
+def segment_lengths(points: np.ndarray) -> np.ndarray:
+    """Haversine length in metres of every segment of an (n, 2) lon/lat array."""
+    if len(points) < 2:
+        return np.zeros(0)
+    lon = np.radians(points[:, 0])
+    lat = np.radians(points[:, 1])
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def urban_mask(lengths: np.ndarray, n_points: int, window: int = URBAN_WINDOW,
+               threshold_m: float = URBAN_SEGMENT_LENGTH_M) -> np.ndarray:
+    """
+    Flag route points lying in dense (urban) stretches.
+
+    Point i looks at the points in [i - window, i + window) and is urban when the mean
+    length of the segments between them is below the threshold. The rolling means come
+    from one cumulative sum, so this is O(n) regardless of the window.
+    """
+    index = np.arange(n_points)
+    start = np.maximum(0, index - window)
+    end = np.minimum(n_points, index + window)
+    counts = end - start - 1  # segments inside the window
+
+    cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+    sums = cumulative[np.maximum(end - 1, start)] - cumulative[start]
+    means = np.divide(sums, counts, out=np.full(n_points, np.inf), where=counts > 0)
+    return (end - start >= 3) & (means < threshold_m)
+
+
+def adaptive_sample_indices(points: np.ndarray, min_spacing_m: float = MIN_SAMPLE_SPACING_M,
+                            rural_factor: float = RURAL_SPACING_FACTOR) -> np.ndarray:
+    """
+    Indices of the route points to sample: always the first and last point, and in between
+    the next point at least the local spacing (urban or rural) beyond the previous sample.
+
+    Spacing is measured along the route. Point j is eligible after sample s when
+    dist[j] - spacing[j] >= dist[s]; a running maximum of the left side turns "first
+    eligible j" into a binary search, so each sample costs O(log n).
+    """
+    n = len(points)
+    if n <= 2:
+        return np.arange(n)
+
+    lengths = segment_lengths(points)
+    distance = np.concatenate(([0.0], np.cumsum(lengths)))
+    spacing = np.where(urban_mask(lengths, n), min_spacing_m, min_spacing_m * rural_factor)
+    # Plain lists: bisect on them is much cheaper per call than np.searchsorted
+    reach = np.maximum.accumulate(distance - spacing).tolist()
+    distance = distance.tolist()
+
+    indices = [0]
+    while True:
+        nxt = bisect_left(reach, distance[indices[-1]])
+        if nxt >= n - 1:
+            break
+        indices.append(nxt)
+    indices.append(n - 1)
+    return np.asarray(indices)
+
+
+def adaptive_sample(coordinates: List[List[float]]) -> List[List[float]]:
+    """Sampled subset of the route coordinates (see `adaptive_sample_indices`)."""
+    if len(coordinates) == 0:
+        return []
+    return [coordinates[i] for i in adaptive_sample_indices(as_lonlat_array(coordinates))]
@@ -0,0 +1,594 @@
+import os
+import json
+import logging
+import time
+import pickle
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+import faiss
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process build lock
+    fcntl = None
+from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+# Chunker settings shared by every entry point that builds the rules index
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
+
+# Bump whenever the on-disk layout or the way chunks are built changes
+INDEX_FORMAT_VERSION = 6
+
+# Where persisted indexes live (one sub-directory per chunker/embedding configuration),
+# overridable through INDEX_CACHE_DIR
+DEFAULT_INDEX_CACHE_DIR = ".index_cache"
+
+MANIFEST_FILE = "manifest.json"
+
+# Up-to-date cached indexes are served memory-mapped from their file (INDEX_MMAP=0 loads them
+# into memory instead), so every worker process shares one copy of the vectors in the page cache
+DEFAULT_INDEX_MMAP = True
+
+# Chunks handed to the embedder at a time while building, so progress can be reported.
+# Scaled up by the embedder's own batch size and worker count so its pool stays busy.
+EMBED_PROGRESS_BATCH = 32
+
+# Seconds between checks of the rules corpus for added, changed or removed PDFs
+DEFAULT_RELOAD_INTERVAL = 10
+
+
+def file_sha256(path):
+    """
+    Hash the raw bytes of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def rules_documents(default_pdf_path):
+    """
+    The rules PDFs to index: every PDF in RULES_CORPUS_DIR when it is set, otherwise
+    the single default PDF. Sorted by name so the corpus order is stable.
+    """
+    corpus_dir = os.getenv("RULES_CORPUS_DIR")
+    if not corpus_dir:
+        return [default_pdf_path]
+    return sorted(
+        os.path.join(corpus_dir, name)
+        for name in os.listdir(corpus_dir)
+        if name.lower().endswith(".pdf") and not name.startswith(".")
+    )
+
+
+def document_name(pdf_path):
+    """
+    Name a rules document is known by in chunk metadata and query filters.
+    """
+    return os.path.basename(pdf_path)
+
+
+def corpus_state(pdf_paths):
+    """
+    Cheap change marker of a set of PDFs: name, size and modification time of each.
+    """
+    state = {}
+    for path in pdf_paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        state[document_name(path)] = (stat.st_size, stat.st_mtime_ns)
+    return state
+
+
+def chunk_id(text, source=None):
+    """
+    Content address of a chunk: the same text from the same document always maps to the
+    same id (and embedding). A passage shared by two documents gets one id per document,
+    so each keeps its own `source` and source filters find it in both.
+    """
+    key = text if source is None else f"{source}\0{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def doc_chunk_id(doc):
+    """
+    Id of a chunk returned by the vector store (a langchain Document).
+    """
+    return chunk_id(doc.page_content, doc.metadata.get("source"))
+
+
+def index_cache_key(model_name, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Build the cache key for a rules index.
+    Changing the chunker settings or the embedding model gives a new key, so vectors
+    from incompatible configurations are never mixed. PDF edits keep the key and are
+    applied incrementally (see `update_vector_store`).
+    """
+    payload = json.dumps({
+        "version": INDEX_FORMAT_VERSION,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "embedding_model": model_name,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def update_vector_store(vectorstore, chunks, embedding, progress=None):
+    """
+    Bring a FAISS store in line with a new set of chunks, embedding only what changed.
+
+    Every chunk is stored under the hash of its document and text, so the diff against the existing
+    index is a set difference: new hashes are added, hashes that no longer appear are
+    deleted, and the rest keep their vectors. A new chunk whose text is already indexed
+    (a renamed document, a passage repeated in another one) copies that vector; only text
+    not in the index is embedded, once however many documents contain it.
+
+    Args:
+        vectorstore: Existing FAISS store, or None to build from scratch
+        chunks: List of {"text": ..., "metadata": {...}} dicts in document order
+        embedding: Embedding model used for new chunks
+        progress: Optional callable(stage, done, total) notified as chunks are embedded
+
+    Returns:
+        (vectorstore, report) where report counts reused, recomputed and removed embeddings
+    """
+    wanted = {}
+    for chunk in chunks:
+        wanted.setdefault(chunk_id(chunk["text"], chunk.get("metadata", {}).get("source")), chunk)
+
+    if not wanted:
+        raise ValueError("No text could be extracted from the rules document.")
+
+    existing = set(vectorstore.index_to_docstore_id.values()) if vectorstore is not None else set()
+    stale = [cid for cid in existing if cid not in wanted]
+    added = [cid for cid in wanted if cid not in existing]
+
+    # Metadata may change even when the text does not (e.g. the chunk moved)
+    for cid in existing.intersection(wanted):
+        vectorstore.docstore.search(cid).metadata = dict(wanted[cid].get("metadata", {}))
+
+    texts = [wanted[cid]["text"] for cid in added]
+    # Copied before the delete below, which renumbers the vectors
+    vectors = _indexed_vectors(vectorstore, texts) if added and vectorstore is not None else [None] * len(texts)
+
+    if stale:
+        vectorstore.delete(stale)
+
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        step = max(EMBED_PROGRESS_BATCH, getattr(embedding, "batch_size", 1) * getattr(embedding, "max_workers", 1))
+        embedded = []
+        for start in range(0, len(missing), step):
+            if progress:
+                progress("embedding", start, len(missing))
+            embedded.extend(embedding.embed_documents(missing[start:start + step]))
+        embedded = dict(zip(missing, embedded))
+        vectors = [embedded[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+    if added:
+        metadatas = [dict(wanted[cid].get("metadata", {})) for cid in added]
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(list(zip(texts, vectors)), embedding, metadatas=metadatas, ids=added)
+        else:
+            vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=added)
+
+    report = {
+        "reused": len(wanted) - len(missing),
+        "recomputed": len(missing),
+        "removed": len(stale),
+    }
+    return vectorstore, report
+
+
+def _indexed_vectors(vectorstore, texts):
+    """
+    The vector already stored for each text, or None for texts the store does not hold
+    (or when its FAISS index cannot reconstruct vectors).
+    """
+    positions = {}
+    for position, cid in vectorstore.index_to_docstore_id.items():
+        positions.setdefault(chunk_id(vectorstore.docstore.search(cid).page_content), position)
+    vectors = []
+    for text in texts:
+        position = positions.get(chunk_id(text))
+        try:
+            vectors.append(None if position is None else vectorstore.index.reconstruct(position).tolist())
+        except RuntimeError:
+            vectors.append(None)
+    return vectors
+
+
+def index_fingerprint(vectorstore):
+    """
+    Content fingerprint of an index: identical chunks give the same value across restarts.
+    """
+    ids = sorted(vectorstore.index_to_docstore_id.values())
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+
+
+def load_faiss_index(index_dir, embedding, mmap=False):
+    """
+    Load a FAISS store saved with `save_local`.
+    With `mmap`, the vectors are not read into memory but mapped from the file and paged in
+    on demand. A mapped index is read-only (adding or deleting vectors aborts the process),
+    so only stores that are served as they are, never updated, are mapped.
+    """
+    if not mmap or not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return FAISS.load_local(index_dir, embedding, allow_dangerous_deserialization=True)
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embedding, index, docstore, index_to_docstore_id)
+
+
+def load_or_build_vector_store(pdf_paths, embedding, model_name, build, cache_dir=None, progress=None, mmap=None):
+    """
+    Load the FAISS rules index from the on-disk cache, updating it if any rules PDF was
+    added, changed or removed.
+
+    Args:
+        pdf_paths: Paths of the rules PDFs (a single path is accepted too)
+        embedding: Embedding model used to query the index
+        model_name: Name of the embedding model (part of the cache key)
+        build: Callable taking the PDF paths, the previous FAISS store (or None) and the
+            progress callable, returning (vectorstore, report) as `update_vector_store` does
+        cache_dir: Root directory of the index cache (defaults to INDEX_CACHE_DIR)
+        progress: Optional callable(stage, done, total) notified as the build advances
+        mmap: Serve the persisted index memory-mapped (defaults to INDEX_MMAP, on)
+    """
+    if isinstance(pdf_paths, str):
+        pdf_paths = [pdf_paths]
+    cache_dir = cache_dir or os.getenv("INDEX_CACHE_DIR", DEFAULT_INDEX_CACHE_DIR)
+    if mmap is None:
+        mmap = os.getenv("INDEX_MMAP", "1" if DEFAULT_INDEX_MMAP else "0") not in ("0", "false", "no")
+    progress = progress or (lambda stage, done=0, total=0: None)
+    progress("hashing")
+    documents = {document_name(path): file_sha256(path) for path in pdf_paths}
+    key = index_cache_key(model_name)
+    index_dir = os.path.join(cache_dir, key)
+    manifest = _read_manifest(index_dir)
+    if manifest is not None and manifest.get("documents") == documents:
+        progress("loading")
+        cached = _load_cached_index(index_dir, embedding, mmap)
+        if cached is not None:
+            return cached
+
+    # The index needs updating. Processes sharing the cache (gunicorn workers) update it one
+    # at a time; the others wait here and then load what the first one saved.
+    with _build_lock(index_dir):
+        manifest = _read_manifest(index_dir)
+        if manifest is not None and manifest.get("documents") == documents:
+            progress("loading")
+            cached = _load_cached_index(index_dir, embedding, mmap)
+            if cached is not None:
+                return cached
+
+        previous = None
+        if manifest is not None:
+            progress("loading")
+            # Loaded into memory, never mapped: it is about to be updated
+            previous = _load_cached_index(index_dir, embedding, mmap=False)
+        return _update_index(pdf_paths, documents, previous, index_dir, model_name, build, progress, embedding, mmap)
+
+
+def _load_cached_index(index_dir, embedding, mmap):
+    """
+    Load a persisted index, or None (after logging why) if it cannot be read.
+    Always a fresh copy: the store being served is never modified in place.
+    """
+    key = os.path.basename(index_dir)
+    started = time.perf_counter()
+    try:
+        vectorstore = load_faiss_index(index_dir, embedding, mmap=mmap)
+    except Exception as e:
+        logger.warning("Cached rules index %s is unreadable, rebuilding: %s", key, e)
+        return None
+    logger.info("Loaded cached rules index %s in %.1f ms%s", key, (time.perf_counter() - started) * 1000,
+                " (memory-mapped)" if mmap else "")
+    return vectorstore
+
+
+def _update_index(pdf_paths, documents, previous, index_dir, model_name, build, progress, embedding, mmap):
+    """
+    Build (or update `previous`) and persist the index; the caller holds the build lock.
+    """
+    key = os.path.basename(index_dir)
+    started = time.perf_counter()
+    vectorstore, report = build(pdf_paths, previous, progress)
+    logger.info(
+        "Updated rules index %s from %d document(s) in %.1f s: reused %d embeddings, recomputed %d, removed %d",
+        key, len(pdf_paths), time.perf_counter() - started, report["reused"], report["recomputed"], report["removed"],
+    )
+
+    progress("saving")
+    saved = _save_index(vectorstore, index_dir, {
+        "version": INDEX_FORMAT_VERSION,
+        "documents": documents,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": model_name,
+        "chunks": len(vectorstore.index_to_docstore_id),
+        "last_update": report,
+        "created_at": time.time(),
+    })
+    if mmap and saved:
+        # Serve the file just written, so processes that load it later share its pages
+        return load_faiss_index(index_dir, embedding, mmap=True)
+    return vectorstore
+
+
+def _read_manifest(index_dir):
+    """
+    Read the manifest of a persisted index, or None if there is no usable one.
+    """
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == INDEX_FORMAT_VERSION else None
+
+
+@contextmanager
+def _build_lock(index_dir):
+    """
+    Exclusive lock (an flock on `<index_dir>.lock`) held while an index is rebuilt and
+    saved, across every process and thread sharing the cache directory. Without a writable
+    cache directory (or fcntl) there is nothing to coordinate and no lock is taken.
+    """
+    try:
+        os.makedirs(os.path.dirname(index_dir) or ".", exist_ok=True)
+        lock_file = open(f"{index_dir}.lock", "a")
+    except OSError:
+        lock_file = None
+    if lock_file is None or fcntl is None:
+        yield
+        return
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+    finally:
+        lock_file.close()  # Releases the lock
+
+
+def _save_index(vectorstore, index_dir, manifest):
+    """
+    Persist the index next to its manifest.
+    Everything is written to a temporary directory first. The previous index is then
+    renamed aside, the new one renamed into place, and only then is the old one deleted,
+    so a crash mid-write never leaves a half-written index behind. A reader that looks in
+    the instant between the two renames finds no manifest, waits on the build lock and loads
+    the new index. Processes that have the previous file memory-mapped keep reading it
+    until they reload. Call with the build lock held. Returns whether the index was saved.
+    """
+    cache_dir = os.path.dirname(index_dir) or "."
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir)
+    old_dir = None
+
+    try:
+        vectorstore.save_local(tmp_dir)
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+            f.write(json.dumps(manifest, indent=4))
+
+        if os.path.exists(index_dir):
+            old_dir = tempfile.mkdtemp(prefix=".old-", dir=cache_dir)
+            os.replace(index_dir, old_dir)  # Onto the empty placeholder directory
+        os.replace(tmp_dir, index_dir)
+    except OSError as e:
+        # A read-only cache directory must not stop the app from serving
+        logger.warning("Could not persist rules index to %s: %s", index_dir, e)
+        if old_dir is not None and not os.path.exists(index_dir):
+            os.replace(old_dir, index_dir)  # Put the previous index back
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        return False
+
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return True
+
+
+# What a request works against: the store and the version/fingerprint that describe it
+IndexSnapshot = namedtuple("IndexSnapshot", ["vectorstore", "version", "fingerprint"])
+
+
+class BackgroundIndexBuilder:
+    """
+    Build the rules index on a background thread so the app can serve requests
+    (health checks, the UI) while the index is still loading.
+
+    `refresh()` rebuilds it again later (e.g. when the rules corpus changes). The current
+    index keeps serving until the new one is ready, and the swap is a single assignment:
+    requests that took a `snapshot()` before it finish on the old version.
+    """
+
+    def __init__(self, load):
+        """
+        Args:
+            load: Callable taking a progress callable and returning the FAISS store
+        """
+        self._load = load
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+        self._snapshot = IndexSnapshot(None, 0, None)
+        self.reloads = 0
+        self.error = None
+        self.state = "pending"
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def vectorstore(self):
+        return self._snapshot.vectorstore
+
+    @property
+    def version(self):
+        """Bumped every time a new vectorstore is published."""
+        return self._snapshot.version
+
+    @property
+    def fingerprint(self):
+        """Stable across restarts: hash of the chunk ids in the index."""
+        return self._snapshot.fingerprint
+
+    def snapshot(self):
+        """
+        The published index as one consistent (vectorstore, version, fingerprint) triple.
+        """
+        return self._snapshot
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._start_thread()
+        return self
+
+    def refresh(self):
+        """
+        Rebuild in the background. A refresh requested mid-build runs once that build ends.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._pending = True
+            else:
+                self._start_thread()
+        return self
+
+    def _start_thread(self):
+        self.started_at = time.time()
+        self.finished_at = None
+        self.state = "reloading" if self.vectorstore is not None else "building"
+        self._thread = threading.Thread(target=self._run, name="rules-index-builder", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            vectorstore = self._load(self._report_progress)
+        except Exception as e:
+            logger.error("Building the rules index failed: %s", e)
+            self.error = str(e)
+            # A failed reload keeps serving the previous index
+            self.state = "ready" if self.vectorstore is not None else "failed"
+        else:
+            if self.vectorstore is not None:
+                self.reloads += 1
+            self._snapshot = IndexSnapshot(vectorstore, self.version + 1, index_fingerprint(vectorstore))
+            self.error = None
+            self.state = "ready"
+        self.stage = None
+        self.finished_at = time.time()
+
+        with self._lock:
+            if self._pending:
+                self._pending = False
+                self._start_thread()
+
+    def _report_progress(self, stage, done=0, total=0):
+        self.stage = stage
+        self.done = done
+        self.total = total
+
+    @property
+    def ready(self):
+        return self.vectorstore is not None
+
+    @property
+    def failed(self):
+        return self.state == "failed"
+
+    def status(self):
+        """
+        Snapshot of the build for the health/readiness endpoints.
+        """
+        status = {"state": self.state, "version": self.version}
+        if self.stage:
+            status["stage"] = self.stage
+        if self.total:
+            status["progress"] = {"done": self.done, "total": self.total}
+        if self.started_at:
+            status["elapsed_seconds"] = round((self.finished_at or time.time()) - self.started_at, 2)
+        if self.reloads:
+            status["reloads"] = self.reloads
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+class CorpusWatcher:
+    """
+    Poll the rules corpus and call `on_change` when a PDF is added, changed or removed.
+    Changes are detected by name, size and modification time (see `corpus_state`); the
+    rebuild itself hashes contents, so a touched but unchanged file costs no embeddings.
+    """
+
+    def __init__(self, list_documents, on_change, interval=DEFAULT_RELOAD_INTERVAL, state=None):
+        """
+        Args:
+            list_documents: Callable returning the current rules PDF paths
+            on_change: Callable run (on the watcher thread) after a change is seen
+            interval: Seconds between polls
+            state: Corpus state to compare the first poll against (defaults to the current one),
+                e.g. the state another watcher last saw
+        """
+        self._list_documents = list_documents
+        self._on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._state = {}
+        self._state = state if state is not None else self._read_state()
+
+    @property
+    def state(self):
+        """Corpus state as of the last poll."""
+        return self._state
+
+    def _read_state(self):
+        try:
+            return corpus_state(self._list_documents())
+        except OSError as e:
+            # e.g. the corpus directory is being replaced; try again on the next poll
+            logger.warning("Could not read the rules corpus: %s", e)
+            return self._state
+
+    def check(self):
+        """
+        Compare the corpus with the last poll; returns True (after calling on_change) if it changed.
+        """
+        state = self._read_state()
+        if state == self._state:
+            return False
+        added = sorted(set(state) - set(self._state))
+        removed = sorted(set(self._state) - set(state))
+        changed = sorted(name for name in set(state) & set(self._state) if state[name] != self._state[name])
+        logger.info("Rules corpus changed (added %s, changed %s, removed %s), rebuilding the index", added, changed, removed)
+        self._state = state
+        self._on_change()
+        return True
+
+    def start(self):
+        threading.Thread(target=self._run, name="rules-corpus-watcher", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
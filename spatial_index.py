@@ -0,0 +1,81 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+METRES_PER_DEGREE_LAT = 110540.0
+METRES_PER_DEGREE_LON = 111320.0
+
+
+class GridIndex:
+    """
+    Uniform grid hash over [lon, lat] points for fixed-radius neighbour queries.
+
+    Points are projected to local metres (equirectangular around the mean latitude,
+    accurate to well under a percent over a route corridor) and bucketed into square
+    cells of `cell_m`. A radius query only inspects the cells the radius can reach,
+    so building is O(n) and each query is O(points nearby).
+    """
+
+    def __init__(self, locations: Sequence[Sequence[float]], cell_m: float):
+        self.cell_m = cell_m
+        points = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        self.origin_lat = float(points[:, 1].mean()) if len(points) else 0.0
+        self._lon_scale = METRES_PER_DEGREE_LON * math.cos(math.radians(self.origin_lat))
+        self.xy = self._project(points)
+
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i, (cx, cy) in enumerate(np.floor(self.xy / cell_m).astype(np.int64).tolist()):
+            self.cells[(cx, cy)].append(i)
+
+    def _project(self, points: np.ndarray) -> np.ndarray:
+        return np.column_stack([points[:, 0] * self._lon_scale, points[:, 1] * METRES_PER_DEGREE_LAT])
+
+    def within(self, location: Sequence[float], radius_m: float) -> List[int]:
+        """Indices of the points within `radius_m` of a [lon, lat] location, nearest first."""
+        x, y = self._project(np.asarray([location], dtype=np.float64))[0]
+        reach = int(math.ceil(radius_m / self.cell_m))
+        cx, cy = int(math.floor(x / self.cell_m)), int(math.floor(y / self.cell_m))
+
+        candidates = []
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                candidates.extend(self.cells.get((cx + dx, cy + dy), ()))
+        if not candidates:
+            return []
+
+        candidates = np.asarray(candidates)
+        distances = np.hypot(self.xy[candidates, 0] - x, self.xy[candidates, 1] - y)
+        order = np.argsort(distances, kind="stable")
+        return [int(candidates[i]) for i in order if distances[i] <= radius_m]
+
+    def clusters(self, radius_m: float) -> List[List[int]]:
+        """
+        Group points that are within `radius_m` of each other (transitively).
+        Clusters and their members are listed in the original point order.
+        """
+        parent = list(range(len(self.xy)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        xs, ys = self.xy[:, 0].tolist(), self.xy[:, 1].tolist()
+        reach = int(math.ceil(radius_m / self.cell_m))
+        offsets = [(dx, dy) for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)]
+        for (cx, cy), members in self.cells.items():
+            for dx, dy in offsets:
+                neighbours = self.cells.get((cx + dx, cy + dy))
+                if not neighbours:
+                    continue
+                for i in members:
+                    for j in neighbours:
+                        if i < j and math.hypot(xs[i] - xs[j], ys[i] - ys[j]) <= radius_m:
+                            parent[find(j)] = find(i)
+
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(parent)):
+            groups.setdefault(find(i), []).append(i)
+        return list(groups.values())
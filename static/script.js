@@ -18,6 +18,7 @@ class RoadScanner {
         this.originMarker = null;
         this.destinationMarker = null;
         this.currentRouteData = null;
+        this.routeId = null;
         this.routeGeometry = null;
         this.routeSteps = null;
         this.parkingMarkers = [];
@@ -101,18 +102,25 @@ class RoadScanner {
         chatInput.value = '';
 
         try {
-            const response = await fetch('http://127.0.0.1:8000/query', {
+            const response = await fetch('http://127.0.0.1:8000/query/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    query: message
+                    query: message,
+                    route_id: this.routeId
                 })
             });
 
             if (!response.ok) throw new Error('Server response error');
 
-            const data = await response.json();
-            this.addMessageToChat(this.formatChatResponse(data.response), 'bot'); // Format the response
+            // Early answers (e.g. "No relevant information found.") come back as plain JSON
+            if (!response.headers.get('Content-Type')?.startsWith('text/event-stream')) {
+                const data = await response.json();
+                this.addMessageToChat(this.formatChatResponse(data.response), 'bot');
+                return;
+            }
+
+            await this.renderStreamedResponse(response);
 
         } catch (error) {
             console.error('Chat Error:', error);
@@ -120,6 +128,45 @@ class RoadScanner {
         }
     }
 
+    async renderStreamedResponse(response) {
+        // Render tokens from the Server-Sent Events stream as they arrive
+        const messageDiv = this.addMessageToChat('<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span>', 'bot');
+        const chatMessages = document.getElementById('chat-messages');
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+
+            for (const frame of frames) {
+                const event = frame.match(/^event: (.*)$/m)?.[1];
+                const data = frame.match(/^data: (.*)$/m)?.[1];
+                if (!event || !data) continue;
+
+                const payload = JSON.parse(data);
+                if (event === 'token') {
+                    text += payload.text;
+                    messageDiv.innerHTML = this.formatChatResponse(text);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (event === 'done') {
+                    console.log('Query timing:', payload.timing);
+                } else if (event === 'error') {
+                    if (!text) messageDiv.remove();
+                    throw new Error(payload.error);
+                }
+            }
+        }
+
+        if (!text) messageDiv.remove();
+    }
+
     formatChatResponse(response) {
         // Remove unwanted ** characters and format the response
         response = response.replace(/\*\*/g, '');
@@ -616,6 +663,7 @@ class RoadScanner {
         messageDiv.innerHTML = message;
         chatMessages.appendChild(messageDiv);
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageDiv;
     }
 
     showLoadingState(isLoading) {
@@ -823,6 +871,7 @@ class RoadScanner {
             if (!response.ok) throw new Error('Server response error');
 
             const data = await response.json();
+            this.routeId = data.route_id; // Sent with every chat query about this route
             console.log(data.message); // Log the message from the backend
 
         } catch (error) {
@@ -0,0 +1,397 @@
+import os
+import sys
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds: stages range from sub-millisecond searches to multi-second Gemini calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Requests slower than this are logged with their per-stage breakdown (overridable through SLOW_REQUEST_MS)
+DEFAULT_SLOW_REQUEST_MS = 5000
+
+# Sampling profiler (opt-in through PROFILE_SLOW_REQUESTS): seconds between stack samples,
+# stack depth kept per sample and number of hottest stacks logged per slow request
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_DEPTH = 40
+PROFILE_TOP_STACKS = 10
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def configure_logging():
+    """Log to stderr at LOG_LEVEL (default INFO), unless the server already configured logging."""
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + self._render_samples()
+
+
+class Counter(_Metric):
+    """Monotonic counter per label set."""
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            series = list(self._series.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in series]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, such as the number of requests in flight."""
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the enclosed block as in flight while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram per label set, as Prometheus expects. Observing is one lock
+    and a bucket scan, cheap enough for every stage of every request.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in series:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=_format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le='+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+# A collector returns (name, type, help, samples) families computed at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, rendered in the Prometheus text format. Metrics are created
+    once by name, so every module of a combined app shares the same series.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def register_collector(self, collector: Collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics, collectors = list(self._metrics.values()), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        families: Dict[str, Tuple[str, str, List[Sample]]] = {}
+        for collector in collectors:
+            try:
+                for name, type_, help, samples in collector():
+                    families.setdefault(name, (type_, help, []))[2].extend(samples)
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+        for name, (type_, help, samples) in families.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {type_}"]
+            lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served by /metrics
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "atrip_stage_duration_seconds", "Time spent in each stage of a request.", ["stage"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "atrip_request_duration_seconds", "HTTP request latency, until the last byte of streamed responses.",
+    ["endpoint", "method", "status"])
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "atrip_requests_in_flight", "HTTP requests being served.", ["endpoint"])
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    "atrip_upstream_in_flight", "Calls to Gemini, the embedder or Overpass waiting for an answer.", ["upstream"])
+
+# Stages of the request being served (a list of (stage, seconds)), for the slow-request log
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time the enclosed block into the stage histogram and the current request's trace.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((stage, elapsed))
+
+
+def in_request_context(fn: Callable) -> Callable:
+    """
+    Wrap `fn` to run in a copy of the caller's context, so spans recorded on a worker
+    thread (Overpass fetches, batched answers) still land in the request's trace.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def cache_collector(caches: Dict[str, Callable[[], Dict]]) -> Collector:
+    """
+    Collector exposing hits, misses and hit ratio of caches whose `stats()` dicts carry
+    `hits` (a number, or a dict of numbers per tier), `misses` and `hit_ratio`.
+    """
+    def collect():
+        hits, misses, ratios = [], [], []
+        for name, stats in caches.items():
+            values = stats()
+            cache_hits = values.get("hits", 0)
+            if isinstance(cache_hits, dict):
+                cache_hits = sum(cache_hits.values())
+            labels = {"cache": name}
+            hits.append((labels, cache_hits))
+            misses.append((labels, values.get("misses", 0)))
+            ratios.append((labels, values.get("hit_ratio", 0.0)))
+        return [
+            ("atrip_cache_hits_total", "counter", "Cache lookups answered from the cache.", hits),
+            ("atrip_cache_misses_total", "counter", "Cache lookups that missed.", misses),
+            ("atrip_cache_hit_ratio", "gauge", "Share of cache lookups answered from the cache.", ratios),
+        ]
+    return collect
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for request threads: one daemon thread samples the stacks of the
+    registered threads every `interval` seconds (sys._current_frames), so the cost is a
+    stack walk per sample rather than a hook on every function call.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, max_depth: int = PROFILE_MAX_DEPTH):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._samples: Dict[int, Dict[str, int]] = {}  # thread id -> collapsed stack -> samples
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id: int):
+        with self._lock:
+            self._samples[thread_id] = {}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id: int) -> Dict[str, int]:
+        with self._lock:
+            return self._samples.pop(thread_id, {})
+
+    def _collapse(self, frame) -> str:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                thread_ids = list(self._samples)
+            if not thread_ids:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in thread_ids:
+                    samples = self._samples.get(thread_id)
+                    frame = frames.get(thread_id)
+                    if samples is not None and frame is not None:
+                        stack = self._collapse(frame)
+                        samples[stack] = samples.get(stack, 0) + 1
+
+
+def instrument_app(app, registry: MetricsRegistry = REGISTRY):
+    """
+    Time every request of a Flask app into the request histogram, count requests in
+    flight and serve the registry on /metrics.
+
+    Requests slower than SLOW_REQUEST_MS are logged with their stage breakdown. With
+    PROFILE_SLOW_REQUESTS set, a share (PROFILE_SAMPLE_RATE, default all) of requests is
+    also stack-sampled and the hottest stacks of the slow ones are logged.
+    """
+    from flask import Response, g, request
+
+    slow_request_s = float(os.getenv("SLOW_REQUEST_MS", DEFAULT_SLOW_REQUEST_MS)) / 1000
+    profiler = SamplingProfiler() if os.getenv("PROFILE_SLOW_REQUESTS") else None
+    profile_rate = float(os.getenv("PROFILE_SAMPLE_RATE", 1.0))
+
+    def finish(trace):
+        """Record a finished request; `trace` holds what before_request captured."""
+        elapsed = time.perf_counter() - trace["started"]
+        REQUESTS_IN_FLIGHT.dec(endpoint=trace["endpoint"])
+        REQUEST_SECONDS.observe(elapsed, endpoint=trace["endpoint"], method=trace["method"], status=trace["status"])
+        samples = profiler.stop(trace["thread"]) if trace["thread"] is not None else None
+
+        if elapsed < slow_request_s:
+            return
+        stages = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in trace["stages"])
+        logger.warning("Slow request %s %s: %.1f ms (%s)", trace["method"], trace["path"], elapsed * 1000, stages or "no stages")
+        if samples:
+            total = sum(samples.values())
+            hottest = sorted(samples.items(), key=lambda item: -item[1])[:PROFILE_TOP_STACKS]
+            logger.warning("Profile of %s (%d samples, %.0f ms apart):\n%s", trace["path"], total,
+                           profiler.interval * 1000,
+                           "\n".join(f"{count:6d} {count / total:6.1%} {stack}" for stack, count in hottest))
+
+    @app.before_request
+    def start_request_trace():
+        g.telemetry = trace = {
+            "started": time.perf_counter(),
+            "endpoint": request.endpoint or "unmatched",
+            "method": request.method,
+            "path": request.path,
+            "status": 500,
+            "stages": [],
+            "thread": None,
+        }
+        g.telemetry_token = _current_trace.set(trace["stages"])
+        REQUESTS_IN_FLIGHT.inc(endpoint=trace["endpoint"])
+        if profiler is not None and random.random() < profile_rate:
+            trace["thread"] = threading.get_ident()
+            profiler.start(trace["thread"])
+
+    # Finish once the response is fully sent, so streamed answers are timed to their last event
+    @app.after_request
+    def finish_on_close(response):
+        trace = g.pop("telemetry", None)
+        if trace is not None:
+            trace["status"] = response.status_code
+            response.call_on_close(lambda: finish(trace))
+            if response.is_streamed:
+                # The body is generated after teardown; keep the trace current so its stages are recorded
+                g.pop("telemetry_token", None)
+        return response
+
+    @app.teardown_request
+    def finish_request_trace(exc):
+        token = g.pop("telemetry_token", None)
+        if token is not None:
+            _current_trace.reset(token)
+        # Requests that failed before a response was built
+        trace = g.pop("telemetry", None)
+        if trace is not None:
+            finish(trace)
+
+    def metrics():
+        """Prometheus scrape endpoint."""
+        return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    app.add_url_rule("/metrics", "metrics", metrics)
+    return app
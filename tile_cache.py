@@ -0,0 +1,220 @@
+import os
+import math
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from query_cache import TTLCache
+
+# Slippy-map zoom of the cache tiles: z16 tiles are ~375 m across at UK latitudes,
+# close to the ~200 m search buffer around each route sample
+DEFAULT_TILE_ZOOM = 16
+DEFAULT_TILE_TTL = 24 * 3600  # seconds
+DEFAULT_MEMORY_TILES = 20000
+DEFAULT_TILE_CACHE_PATH = ".parking_tiles.sqlite3"
+
+Tile = Tuple[int, int, int]  # (z, x, y)
+
+
+def tile_for(lon: float, lat: float, zoom: int = DEFAULT_TILE_ZOOM) -> Tile:
+    """Slippy-map tile containing a point."""
+    n = 2 ** zoom
+    lat_rad = math.radians(max(min(lat, 85.0511), -85.0511))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return zoom, min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bbox(tile: Tile) -> List[float]:
+    """Bounding box of a tile as [min lon, min lat, max lon, max lat]."""
+    zoom, x, y = tile
+    n = 2 ** zoom
+
+    def lat_of(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return [x / n * 360.0 - 180.0, lat_of(y + 1), (x + 1) / n * 360.0 - 180.0, lat_of(y)]
+
+
+def tiles_covering(bboxes: List[List[float]], zoom: int = DEFAULT_TILE_ZOOM) -> List[Tile]:
+    """Tiles overlapping any of the boxes, unique and in route order."""
+    tiles = {}
+    for bbox in bboxes:
+        _, min_x, min_y = tile_for(bbox[0], bbox[3], zoom)
+        _, max_x, max_y = tile_for(bbox[2], bbox[1], zoom)
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                tiles.setdefault((zoom, x, y), None)
+    return list(tiles)
+
+
+def filters_namespace(filters: List[str]) -> str:
+    """Cache namespace for a set of Overpass tag filters, so differently filtered scans never mix."""
+    return hashlib.sha256("\n".join(filters).encode("utf-8")).hexdigest()[:16]
+
+
+class TileCache:
+    """
+    Spatial cache of processed parking elements, keyed by (namespace, z/x/y tile).
+
+    Tiles are kept in an in-process LRU and, when `path` is set, in SQLite so they
+    survive restarts and are shared between workers. Entries older than `ttl` are
+    treated as missing and fetched again.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_TILE_CACHE_PATH, ttl: float = DEFAULT_TILE_TTL,
+                 zoom: int = DEFAULT_TILE_ZOOM, memory_tiles: int = DEFAULT_MEMORY_TILES):
+        self.ttl = ttl
+        self.zoom = zoom
+        self._memory = TTLCache(memory_tiles, ttl)
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.served_age_total = 0.0
+        self.served_age_max = 0.0
+
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tiles ("
+                " namespace TEXT NOT NULL, z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,"
+                " fetched_at REAL NOT NULL, elements TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, z, x, y))"
+            )
+            self._conn.commit()
+
+    def lookup(self, namespace: str, tiles: List[Tile]) -> Tuple[Dict[Tile, List[Dict]], List[Tile]]:
+        """
+        Split tiles into cached ones (tile -> elements) and missing/expired ones.
+        """
+        now = time.time()
+        found, missing = {}, []
+
+        for tile in tiles:
+            entry = self._memory.get((namespace, tile))
+            if entry is None and self._conn is not None:
+                with self._lock:
+                    row = self._conn.execute(
+                        "SELECT fetched_at, elements FROM tiles WHERE namespace = ? AND z = ? AND x = ? AND y = ?",
+                        (namespace,) + tile,
+                    ).fetchone()
+                if row is not None:
+                    if now - row[0] <= self.ttl:
+                        entry = (row[0], json.loads(row[1]))
+                        self._memory.put((namespace, tile), entry)
+                    else:
+                        self.expired += 1
+
+            if entry is None:
+                missing.append(tile)
+                continue
+
+            fetched_at, elements = entry
+            found[tile] = elements
+            age = now - fetched_at
+            self.served_age_total += age
+            self.served_age_max = max(self.served_age_max, age)
+
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+
+    def store(self, namespace: str, tile_elements: Dict[Tile, List[Dict]]):
+        now = time.time()
+        for tile, elements in tile_elements.items():
+            self._memory.put((namespace, tile), (now, elements))
+
+        if self._conn is not None and tile_elements:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO tiles (namespace, z, x, y, fetched_at, elements) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(namespace,) + tile + (now, json.dumps(elements)) for tile, elements in tile_elements.items()],
+                )
+                self._conn.execute("DELETE FROM tiles WHERE fetched_at < ?", (now - self.ttl,))
+                self._conn.commit()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "zoom": self.zoom,
+            "memory_tiles": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "served_age_seconds": {
+                "mean": round(self.served_age_total / self.hits, 1) if self.hits else 0.0,
+                "max": round(self.served_age_max, 1),
+            },
+        }
+
+
+def scan_route_tiles(cache: TileCache, namespace: str, bboxes: List[List[float]],
+                     fetch: Callable[[List[List[float]]], List[Tuple[List[List[float]], Optional[List[Dict]]]]]) -> List[Dict]:
+    """
+    Collect the processed elements inside the route boxes, fetching only missing tiles.
+
+    Args:
+        cache: Tile cache to read from and fill
+        namespace: Cache namespace of the scan (see `filters_namespace`)
+        bboxes: Search boxes along the route, [min lon, min lat, max lon, max lat]
+        fetch: Callable taking the bboxes of the missing tiles and returning, per request made,
+            (bboxes the request covered, processed elements or None if it failed).
+            Elements must carry a 'location' of [lon, lat] and an 'id'.
+
+    Returns:
+        Elements located inside any route box, unique by id, in route order
+    """
+    tiles = tiles_covering(bboxes, cache.zoom)
+    found, missing = cache.lookup(namespace, tiles)
+
+    if missing:
+        missing_bounds = {tile: tile_bbox(tile) for tile in missing}
+        fetched = {}
+        for covered, elements in fetch(list(missing_bounds.values())):
+            if elements is None:
+                continue  # Tiles of a failed request stay missing and are retried next scan
+            for tile, bounds in missing_bounds.items():
+                if any(_contains(box, bounds) for box in covered):
+                    fetched[tile] = []
+            for element in elements:
+                tile = tile_for(element['location'][0], element['location'][1], cache.zoom)
+                if tile in fetched:
+                    fetched[tile].append(element)
+        cache.store(namespace, fetched)
+        found.update(fetched)
+
+    results, seen = [], set()
+    for bbox in bboxes:
+        for tile in tiles_covering([bbox], cache.zoom):
+            for element in found.get(tile, []):
+                if element['id'] not in seen and _point_in(bbox, element['location']):
+                    seen.add(element['id'])
+                    results.append(element)
+    return results
+
+
+def _contains(outer: List[float], inner: List[float], tolerance: float = 1e-9) -> bool:
+    return (outer[0] <= inner[0] + tolerance and outer[1] <= inner[1] + tolerance
+            and outer[2] >= inner[2] - tolerance and outer[3] >= inner[3] - tolerance)
+
+
+def _point_in(bbox: List[float], location: List[float]) -> bool:
+    return bbox[0] <= location[0] <= bbox[2] and bbox[1] <= location[1] <= bbox[3]
+
+
+def create_tile_cache() -> TileCache:
+    """
+    Build the parking tile cache from PARKING_TILE_CACHE_PATH (empty for memory only),
+    PARKING_TILE_TTL and PARKING_TILE_ZOOM.
+    """
+    return TileCache(
+        path=os.getenv("PARKING_TILE_CACHE_PATH", DEFAULT_TILE_CACHE_PATH) or None,
+        ttl=float(os.getenv("PARKING_TILE_TTL", DEFAULT_TILE_TTL)),
+        zoom=int(os.getenv("PARKING_TILE_ZOOM", DEFAULT_TILE_ZOOM)),
+    )
@@ -0,0 +1,107 @@
+"""
+Production entry point: one app serving the chat API (model.py) together with the route
+page and parking scan (app.py), on a single copy of the rules index.
+
+    gunicorn -c gunicorn.conf.py
+
+gunicorn.conf.py preloads the app in the master process: the index is loaded (memory-mapped,
+see INDEX_MMAP) before the workers are forked, so every worker shares its pages. The master
+then stops watching the rules corpus (`prepare_fork`). Each worker reopens the SQLite-backed
+caches and starts its own rules corpus watcher (`reinitialize_worker`), since neither
+connections nor threads survive a fork. When the corpus changes, every worker's watcher
+fires, but the build lock in rules_index lets only the first one re-embed and save the
+index; the others wait for it and load the saved copy.
+"""
+import gc
+import os
+import time
+import logging
+from flask import Flask
+from flask_cors import CORS
+from telemetry import instrument_app
+
+logger = logging.getLogger(__name__)
+
+# Seconds the master waits for the rules index before forking workers anyway (PRELOAD_INDEX_TIMEOUT)
+DEFAULT_PRELOAD_INDEX_TIMEOUT = 600
+
+
+def create_app():
+    """
+    The chat API and the parking page/scan as one Flask app, with /metrics, /healthz,
+    /readyz and /cache/stats covering both.
+    """
+    import model
+    import app as parking
+
+    server = Flask(__name__)
+    CORS(server)  # Enable CORS for all routes
+    instrument_app(server)
+    server.register_blueprint(model.chat_api)
+    server.register_blueprint(parking.parking_api)
+    model.cache_stats_providers["parking_tiles"] = lambda: parking.parking_tile_cache.stats()
+    return server
+
+
+def prepare_fork(timeout=None):
+    """
+    Run in the master before forking: wait until the rules index (and its BM25 index) is
+    loaded, so workers inherit it instead of each loading their own, then move everything
+    allocated so far out of the garbage collector's reach (gc.freeze) so collections in
+    the workers do not touch, and thereby copy, the shared pages.
+    """
+    import model
+
+    timeout = timeout if timeout is not None else float(os.getenv("PRELOAD_INDEX_TIMEOUT", DEFAULT_PRELOAD_INDEX_TIMEOUT))
+    deadline = time.monotonic() + timeout
+    builder = model.rules_index_builder
+    while not (builder.ready or builder.failed) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if builder.ready:
+        # Built lazily otherwise, once per worker
+        model.rules_retriever.lexical_index(builder.snapshot())
+    else:
+        logger.warning("Forking workers before the rules index is ready: %s", builder.status())
+
+    # Only workers watch the corpus; the master's index is just the template they are forked from
+    watcher = getattr(model, "rules_corpus_watcher", None)
+    if watcher is not None:
+        watcher.stop()
+        model.rules_corpus_state = watcher.state
+        model.rules_corpus_watcher = None
+    gc.freeze()
+
+
+def reinitialize_worker():
+    """
+    Run in each worker right after the fork: reopen the per-process resources the master
+    created (SQLite connections must not be shared across processes) and restart the
+    threads that did not survive the fork.
+    """
+    import model
+    import app as parking
+    from response_cache import create_response_cache
+    from road_data_store import create_road_data_store
+    from tile_cache import create_tile_cache
+    from rules_index import CorpusWatcher, rules_documents
+
+    model.response_cache = create_response_cache(model.LLM_MODEL_NAME)
+    model.road_data_store = create_road_data_store()
+    parking.parking_tile_cache = create_tile_cache()
+
+    builder = model.rules_index_builder
+    if not builder.ready:
+        # The master gave up waiting; this worker builds (or loads) the index itself
+        builder.refresh()
+    if model.RULES_RELOAD_INTERVAL > 0:
+        # Compared against what the master last saw, so a change made since then (e.g. before a
+        # replacement worker is forked) is picked up straight away
+        watcher = CorpusWatcher(lambda: rules_documents(model.RULES_PDF_PATH), builder.refresh,
+                                interval=model.RULES_RELOAD_INTERVAL, state=getattr(model, "rules_corpus_state", None))
+        if builder.ready:
+            watcher.check()
+        model.rules_corpus_watcher = watcher.start()
+
+
+if __name__ == "__main__":
+    create_app().run(port=8000, threaded=True)